@@ -0,0 +1,389 @@
+# ============================================================
+# backtest.py
+# Tick Recorder + Parameter-Sweep Backtester
+# CANDLES BUILT ONCE PER (DAY, INTERVAL), SWEPT ACROSS CORES
+# ============================================================
+#
+# Recorded day layout (written live by TickRecorder when
+# TICK_RECORD_DIR is set):
+#
+#   <root>/<YYYY-MM-DD>/ticks.csv    symbol,ltp,vol_traded_today,exch_feed_time
+#   <root>/<YYYY-MM-DD>/bias.jsonl   one bias_protocol payload per line
+#                                    (+ history seeds)
+#
+# Cluster workers each write their own ticks.w<N>.csv / bias.w<N>.jsonl;
+# a day is replayed from all of them, merged by feed time.
+#
+# Sweep:
+#   python backtest.py <root> --rr 2,2.5,3 --lock 100,200 --risk 500 \
+#       --breadth 60,70 --interval 300 --lookback 0,6 \
+#       --volume lowest,session_p10 [--csv out.csv] \
+#       [--slippage-bps 2 --slippage-ticks 1 --latency-ticks 1 --seed 7]
+#
+# Fills come from each strategy's PaperExchange; the slippage /
+# latency / seed options apply to every grid point (not swept).
+#
+# Days are simulated independently (in parallel), so the tod_p10
+# volume rule, which needs earlier days, is not available here.
+#
+# Only CANDLE_INTERVAL changes candle construction. Every other
+# parameter point reuses the same prepared day, cached in memory per
+# task and pickled next to the day's ticks (rebuilt when any recorded
+# file's size or mtime changes, e.g. a day read while still recording,
+# or when PREPARED_FORMAT changes).
+#
+# As live: a candle's closing tick reaches the strategy's orders first,
+# then the candle close places / cancels / replaces them.
+# ============================================================
+
+import os
+import csv
+import json
+import heapq
+import pickle
+import argparse
+import itertools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from tick_feed import Candle
+from strategy_engine import Strategy
+from volume_sketch import P2Quantile, VOLUME_QUANTILE
+from signal_candle_order import to_paise, from_paise
+from bias_protocol import BiasBook, LegacyAdapter, is_legacy
+
+
+IST_OFFSET = 19800
+PREPARED_FORMAT = 2   # bump when the event stream changes
+
+
+# ------------------------------------------------------------
+# RECORDER (live side)
+# ------------------------------------------------------------
+class TickRecorder:
+    """
+    Writes from the websocket thread; flush() / close() may come from
+    any thread. `tag` names this process's files (cluster workers).
+    """
+
+    def __init__(self, root, tag=""):
+        self.root = root
+        self.tag = tag
+        self.day = None
+        self.fh = None
+        self.writer = None
+        self.lock = threading.Lock()
+
+    def _day(self, ts):
+        from datetime import datetime, timezone
+        return datetime.fromtimestamp(ts + IST_OFFSET, timezone.utc).strftime("%Y-%m-%d")
+
+    def _dir(self, day):
+        path = os.path.join(self.root, day)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def tick(self, symbol, ltp, base_vol, ts):
+        day = self._day(ts)
+        with self.lock:
+            if day != self.day:
+                if self.fh: self.fh.close()
+                self.fh = open(os.path.join(self._dir(day), f"ticks{self.tag}.csv"), "a", newline="", buffering=1 << 16)
+                self.writer = csv.writer(self.fh)
+                self.day = day
+            self.writer.writerow((symbol, ltp, base_vol, ts))
+
+    def bias(self, payload, ts):
+        with open(os.path.join(self._dir(self._day(ts)), f"bias{self.tag}.jsonl"), "a") as fh:
+            fh.write(json.dumps(payload) + "\n")
+
+    def flush(self):
+        with self.lock:
+            if self.fh: self.fh.flush()
+
+    def close(self):
+        with self.lock:
+            if self.fh: self.fh.close()
+            self.fh = self.writer = self.day = None
+
+
+# ------------------------------------------------------------
+# DAY LOADING
+# ------------------------------------------------------------
+def _recorded(day_dir, stem, ext):
+    """ticks.csv / ticks.w0.csv ... (one per recording process), sorted."""
+    return sorted(
+        os.path.join(day_dir, f) for f in os.listdir(day_dir)
+        if f.startswith(stem) and f.endswith(ext)
+    )
+
+
+def list_days(root):
+    return sorted(
+        d for d in os.listdir(root)
+        if os.path.isdir(os.path.join(root, d)) and _recorded(os.path.join(root, d), "ticks", ".csv")
+    )
+
+
+def load_bias(day_dir):
+    """
+    Fold the day's bias payloads through the same book apply_bias uses.
+    Every recording process logs the same payloads (repeats are ignored
+    by the book) plus history seeds for its own symbols, tagged with
+    the epoch they were fetched for.
+    """
+    book, seeds = BiasBook(), {}
+    for path in _recorded(day_dir, "bias", ".jsonl"):
+        legacy, epoch = LegacyAdapter(), None
+        with open(path) as fh:
+            for line in fh:
+                p = json.loads(line)
+                if "history" in p:
+                    seeds.setdefault(epoch, {}).update(p["history"])
+                    continue
+                if is_legacy(p):
+                    p = legacy.convert(p)
+                epoch = p["epoch"]
+                book.ingest(p)
+
+    snap = book.current
+    return snap.bias_ts, set(snap.active), dict(snap.bias), seeds.get(snap.epoch, {})
+
+
+def _read_ticks(path):
+    with open(path, newline="") as fh:
+        for row in csv.reader(fh):
+            if len(row) != 4: continue   # torn last row of a day still recording
+            symbol, ltp, base_vol, ts = row
+            yield int(float(ts)), symbol, float(ltp), int(float(base_vol))
+
+
+def _source_key(day_dir):
+    """Size + mtime of every recorded file: the prepared-day cache key."""
+    key = []
+    for path in _recorded(day_dir, "ticks", ".csv") + _recorded(day_dir, "bias", ".jsonl"):
+        st = os.stat(path)
+        key.append((os.path.basename(path), st.st_size, st.st_mtime_ns))
+    return tuple(key)
+
+
+def prepare_day(day_dir, interval):
+    """
+    Replays recorded ticks into candles once. Returns an event stream:
+      ("T", symbol, ltp)            tick for an active symbol
+      ("C", symbol, candle, vol)    candle close (after the tick that closed it)
+    """
+    cache = os.path.join(day_dir, f"prepared_{interval}.pkl")
+    source = (PREPARED_FORMAT, _source_key(day_dir))
+    if os.path.exists(cache):
+        with open(cache, "rb") as fh:
+            if pickle.load(fh) == source:
+                return pickle.load(fh)
+
+    bias_ts, selected, bias, seeds = load_bias(day_dir)
+    if bias_ts is None:
+        raise ValueError(f"{day_dir}: no bias payload")
+
+    base_before, last_base, candles, events = {}, {}, {}, []
+
+    # Per-worker files hold disjoint symbols; merge them back into one
+    # feed-time ordered stream (a single file replays as written)
+    streams = [_read_ticks(p) for p in _recorded(day_dir, "ticks", ".csv")]
+    for ts, symbol, ltp, base_vol in heapq.merge(*streams, key=lambda t: t[0]):
+
+        if ts < bias_ts:
+            base_before[symbol] = base_vol
+            continue
+        if symbol not in selected:
+            continue
+        if symbol not in last_base and symbol in base_before:
+            last_base[symbol] = base_before[symbol]
+
+        events.append(("T", symbol, ltp))
+
+        start = ts - (ts % interval)
+        c = candles.get(symbol)
+        if c is None or start > c.start:
+            if c is not None and symbol in last_base:
+                vol = c.base_vol - last_base[symbol]
+                last_base[symbol] = c.base_vol
+                events.append(("C", symbol, c, vol))
+            candles[symbol] = Candle(start, ltp, base_vol)
+            continue
+        if start < c.start:
+            continue
+
+        if ltp > c.high: c.high = ltp
+        elif ltp < c.low: c.low = ltp
+        c.close, c.base_vol = ltp, base_vol
+
+    day = {"bias": bias, "seeds": seeds, "events": events}
+    with open(cache, "wb") as fh:
+        pickle.dump(source, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(day, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    return day
+
+
+# ------------------------------------------------------------
+# SIMULATION
+# ------------------------------------------------------------
+def _noop_log(level, msg):
+    pass
+
+
+def simulate(day, params, paper=None):
+    """One parameter point over one prepared day → list of trade P&L (rupees)."""
+    st = Strategy(
+        "bt", log=_noop_log, mode="PAPER",
+        rr_multiplier=params["rr"], lock_profit=params["lock"],
+        per_trade_risk=params["risk"], min_breadth=params["breadth"],
+        volume_rule=params["volume"], paper=paper,
+    )
+    lookback = params["lookback"]
+    bias = day["bias"]
+    book = st.order_state
+    vol_hist = {s: list(v) for s, v in day["seeds"].items()}
+    sketches = {}
+    for s, v in day["seeds"].items():
+        sk = sketches[s] = P2Quantile(VOLUME_QUANTILE)
+        for x in v: sk.add(x)
+    last_ltp = {}
+    exits = {}
+
+    for ev in day["events"]:
+        if ev[0] == "T":
+            _, symbol, ltp = ev
+            last_ltp[symbol] = ltp
+            state = book.get(symbol)
+            if state is not None and state["status"] != "SL_HIT":
+                st.on_ltp(None, symbol, ltp)
+                if state["status"] == "SL_HIT":
+                    exits[symbol] = state["exit_price"]
+            continue
+
+        _, symbol, c, vol = ev
+        hist = vol_hist.setdefault(symbol, [])
+        prev = hist[-lookback:] if lookback else hist
+        is_lowest = bool(prev) and vol < min(prev)
+        hist.append(vol)
+
+        sk = sketches.get(symbol)
+        if sk is None:
+            sk = sketches[symbol] = P2Quantile(VOLUME_QUANTILE)
+        ref = sk.value()
+        below_session = ref is not None and vol < ref
+        sk.add(vol)
+
+        flags = {"lowest": is_lowest, "session_p10": below_session}
+        if not flags[st.volume_rule]:
+            continue
+
+        color = "RED" if c.open > c.close else "GREEN" if c.open < c.close else "DOJI"
+        b, breadth = bias.get(symbol, ("", 0.0))
+        st.on_candle_close(None, symbol, c, volume_flags=flags, color=color, bias=b, breadth=breadth)
+
+    pnl = []
+    for symbol, state in book.items():
+        if state["entry_price"] is None:
+            continue
+        exit_p = exits.get(symbol)
+        if exit_p is None:
+            exit_p = to_paise(last_ltp[symbol])
+        move = exit_p - state["entry_price"] if state["side"] == "BUY" else state["entry_price"] - exit_p
+        pnl.append(from_paise(move * state["qty"]))
+    return pnl
+
+
+def run_task(day_dir, interval, points, paper=None):
+    day = prepare_day(day_dir, interval)
+    return [(i, simulate(day, p, paper)) for i, p in points]
+
+
+# ------------------------------------------------------------
+# SWEEP
+# ------------------------------------------------------------
+def summarize(daily):
+    """daily: list of per-day trade P&L lists, in day order."""
+    trades = [x for d in daily for x in d]
+    equity = peak = max_dd = 0.0
+    for d in daily:
+        for x in d:
+            equity += x
+            peak = max(peak, equity)
+            max_dd = max(max_dd, peak - equity)
+    wins = sum(1 for x in trades if x > 0)
+    return {
+        "trades": len(trades),
+        "pnl": round(sum(trades), 2),
+        "win_rate": round(100 * wins / len(trades), 1) if trades else 0.0,
+        "max_dd": round(max_dd, 2),
+    }
+
+
+def sweep(root, grid, workers=None, paper=None):
+    days = list_days(root)
+    keys = ("rr", "lock", "risk", "breadth", "lookback", "volume")
+    points = [dict(zip(keys, v)) for v in itertools.product(*(grid[k] for k in keys))]
+
+    results = {(iv, i): [None] * len(days) for iv in grid["interval"] for i in range(len(points))}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_task, os.path.join(root, day), iv, list(enumerate(points)), paper): (d, iv)
+            for d, day in enumerate(days)
+            for iv in grid["interval"]
+        }
+        for fut, (d, iv) in futures.items():
+            for i, pnl in fut.result():
+                results[(iv, i)][d] = pnl
+
+    rows = []
+    for (iv, i), daily in results.items():
+        rows.append({"interval": iv, **points[i], **summarize(daily)})
+    rows.sort(key=lambda r: r["pnl"], reverse=True)
+    return rows
+
+
+def _floats(s):
+    return [float(x) for x in s.split(",")]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Parameter sweep over recorded days")
+    ap.add_argument("root")
+    ap.add_argument("--rr", type=_floats, default=[2.5])
+    ap.add_argument("--lock", type=_floats, default=[200.0])
+    ap.add_argument("--risk", type=_floats, default=[500.0])
+    ap.add_argument("--breadth", type=_floats, default=[60.0])
+    ap.add_argument("--interval", type=lambda s: [int(x) for x in s.split(",")], default=[300])
+    ap.add_argument("--lookback", type=lambda s: [int(x) for x in s.split(",")], default=[0])
+    ap.add_argument("--volume", type=lambda s: s.split(","), default=["lowest"])
+    ap.add_argument("--slippage-bps", type=float, default=0.0)
+    ap.add_argument("--slippage-ticks", type=int, default=0)
+    ap.add_argument("--latency-ticks", type=int, default=0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--csv")
+    args = ap.parse_args()
+
+    grid = {k: getattr(args, k) for k in ("rr", "lock", "risk", "breadth", "interval", "lookback", "volume")}
+    if "tod_p10" in grid["volume"]:
+        ap.error("--volume tod_p10 needs earlier days; not supported by the per-day sweep")
+    paper = {"seed": args.seed, "slippage_bps": args.slippage_bps,
+             "slippage_ticks": args.slippage_ticks, "latency_ticks": args.latency_ticks}
+    rows = sweep(args.root, grid, args.workers, paper)
+
+    cols = ("interval", "rr", "lock", "risk", "breadth", "lookback", "volume", "trades", "pnl", "win_rate", "max_dd")
+    print(" ".join(f"{c:>9}" for c in cols))
+    for r in rows:
+        print(" ".join(f"{r[c]:>9}" for c in cols))
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as fh:
+            w = csv.DictWriter(fh, fieldnames=cols)
+            w.writeheader()
+            w.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
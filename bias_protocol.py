@@ -0,0 +1,235 @@
+# ============================================================
+# bias_protocol.py
+# Versioned, Delta-Based Sector Bias Protocol
+# IDEMPOTENT INGEST, ONE ATOMIC SNAPSHOT SWAP
+# ============================================================
+#
+# Payload (one /push-sector-bias call):
+#
+#   {"epoch": 1718079300,           bias_ts of this selection run
+#    "seq": 3,                       1-based, gapless within the epoch
+#    "added":   {"NSE:SBIN-EQ": ["B", 72.5], ...},   active + bias
+#    "changed": {"NSE:TCS-EQ":  ["S", 61.0], ...},   bias only
+#    "removed": ["NSE:INFY-EQ", ...],
+#    "final": true}                  selection complete → trading
+#
+# seq 1 of a newer epoch starts from empty. A bias of null means "no
+# sector bias (yet)": the symbol is active but cannot signal.
+#
+# BiasBook applies payloads strictly in (epoch, seq) order: repeats are
+# ignored, early arrivals are buffered until the gap fills (at most
+# MAX_PENDING; a full buffer evicts its furthest-ahead payload, never
+# the next expected one or a newer epoch's seq 1). Each apply
+# copies the current active set / bias map, edits the copy and
+# publishes it as a new BiasSnapshot. Readers grab the snapshot
+# reference once and never see a half-applied push. The cost is the
+# delta plus one copy of the active set, never the sector universe.
+#
+# Legacy is_first_batch / is_last_batch pushes go through
+# LegacyAdapter, which numbers them in arrival order.
+# ============================================================
+
+import time
+from types import MappingProxyType
+
+from sector_mapping import SECTOR_MAP
+from sector_engine import SECTOR_LIST
+
+
+MAX_PENDING = 64
+NO_BIAS = ("", 0.0)
+
+
+# ------------------------------------------------------------
+# SNAPSHOT
+# ------------------------------------------------------------
+class BiasSnapshot:
+    """Immutable: active is a frozenset, bias a read-only mapping."""
+    __slots__ = ("epoch", "seq", "active", "bias", "done")
+
+    def __init__(self, epoch, seq, active, bias, done):
+        self.epoch = epoch
+        self.seq = seq
+        self.active = active
+        self.bias = bias
+        self.done = done
+
+    @property
+    def bias_ts(self):
+        return self.epoch
+
+    def to_dict(self):
+        return {
+            "epoch": self.epoch,
+            "seq": self.seq,
+            "done": self.done,
+            "active": sorted(self.active),
+            "bias": {s: list(v) for s, v in self.bias.items()},
+        }
+
+
+EMPTY_BIAS = BiasSnapshot(None, 0, frozenset(), MappingProxyType({}), False)
+
+
+# ------------------------------------------------------------
+# BOOK
+# ------------------------------------------------------------
+class BiasBook:
+
+    def __init__(self):
+        self.current = EMPTY_BIAS
+        self.pending = {}    # (epoch, seq) → payload
+        self.stats = {"applied": 0, "duplicate": 0, "buffered": 0, "stale": 0, "dropped": 0}
+
+    def ingest(self, payload, universe=None):
+        """
+        Returns (status, snapshot). status: applied | duplicate |
+        buffered | stale | dropped. snapshot is the book's current one
+        (a new object only when something was applied).
+        """
+        epoch, seq = int(payload["epoch"]), int(payload["seq"])
+        cur = self.current
+
+        if cur.epoch is not None and epoch < cur.epoch:
+            return self._count("stale"), cur
+        if (epoch == cur.epoch and seq <= cur.seq) or (epoch, seq) in self.pending:
+            return self._count("duplicate"), cur
+        if len(self.pending) >= MAX_PENDING:
+            # Buffer full: make room by evicting the furthest-ahead payload,
+            # but never turn away the one that unblocks the book
+            top = max(self.pending)
+            expected = seq == 1 if epoch != cur.epoch else seq == cur.seq + 1
+            if not expected and (epoch, seq) > top:
+                return self._count("dropped"), cur
+            del self.pending[top]
+            self._count("dropped")
+        self.pending[(epoch, seq)] = payload
+
+        if epoch == cur.epoch:
+            active, bias, done, last = set(cur.active), dict(cur.bias), cur.done, cur.seq
+        elif (epoch, 1) in self.pending:
+            active, bias, done, last = set(), {}, False, 0
+        else:
+            return self._count("buffered"), cur
+
+        n = last
+        while (epoch, n + 1) in self.pending:
+            n += 1
+            p = self.pending.pop((epoch, n))
+            for s in p.get("removed", ()):
+                active.discard(s)
+                bias.pop(s, None)
+            for s, b in p.get("added", {}).items():
+                if universe is not None and s not in universe: continue
+                active.add(s)
+                _set_bias(bias, s, b)
+            for s, b in p.get("changed", {}).items():
+                if universe is not None and s not in universe: continue
+                _set_bias(bias, s, b)
+            done = done or bool(p.get("final"))
+
+        if n == last:
+            return self._count("buffered"), cur
+
+        if epoch != cur.epoch:
+            # older epochs can never apply now; this one's later seqs still can
+            self.pending = {k: v for k, v in self.pending.items() if k[0] >= epoch}
+
+        self.current = BiasSnapshot(epoch, n, frozenset(active), MappingProxyType(bias), done)
+        return self._count("applied"), self.current
+
+    def _count(self, status):
+        self.stats[status] += 1
+        return status
+
+
+def _set_bias(bias, symbol, b):
+    if b and b[0]:
+        bias[symbol] = (b[0], float(b[1]))
+    else:
+        bias.pop(symbol, None)
+
+
+# ------------------------------------------------------------
+# LEGACY (is_first_batch / is_last_batch)
+# ------------------------------------------------------------
+# symbol → sector keys it belongs to (built once)
+SYMBOL_SECTORS = {}
+for _key, _members in SECTOR_MAP.items():
+    for _s in _members:
+        SYMBOL_SECTORS.setdefault(_s, []).append(_key)
+
+
+class LegacyAdapter:
+    """
+    Numbers legacy batches in arrival order and turns strong_sectors
+    into per-symbol bias. As before, the most recently pushed strong
+    sector containing a symbol decides its bias.
+    """
+
+    def __init__(self):
+        self.epoch = None
+        self.seq = 0
+        self.sectors = {}    # sector key → (rank, side, breadth)
+        self.emitted = {}    # active symbol → bias last sent
+        self.rank = 0
+
+    def _resolve(self, symbol):
+        best = None
+        for key in SYMBOL_SECTORS.get(symbol, ()):
+            v = self.sectors.get(key)
+            if v is not None and (best is None or v[0] > best[0]):
+                best = v
+        return [best[1], best[2]] if best else None
+
+    def convert(self, data):
+        if data.get("is_first_batch") or self.epoch is None:
+            self.__init__()
+            self.epoch = int(data.get("bias_ts") or time.time())
+        self.seq += 1
+
+        touched = set()
+        for s in data.get("strong_sectors", []):
+            key = SECTOR_LIST.get(s["sector"])
+            if key in SECTOR_MAP:
+                side = "B" if s["bias"] == "BUY" else "S"
+                breadth = float(s.get("up_pct" if s["bias"] == "BUY" else "down_pct", 100.0))
+                self.rank += 1
+                self.sectors[key] = (self.rank, side, breadth)
+                touched.add(key)
+
+        added = {}
+        for s in data.get("selected_stocks", []):
+            if s not in self.emitted:
+                added[s] = self.emitted[s] = self._resolve(s)
+
+        changed = {}
+        for key in touched:
+            for s in SECTOR_MAP[key]:
+                if s in self.emitted and s not in added:
+                    b = self._resolve(s)
+                    if b != self.emitted[s]:
+                        changed[s] = self.emitted[s] = b
+
+        return {
+            "epoch": self.epoch,
+            "seq": self.seq,
+            "added": added,
+            "changed": changed,
+            "removed": [],
+            "final": bool(data.get("is_last_batch")),
+        }
+
+
+def is_legacy(data):
+    return "seq" not in data
+
+
+__all__ = [
+    "BiasSnapshot",
+    "BiasBook",
+    "LegacyAdapter",
+    "EMPTY_BIAS",
+    "NO_BIAS",
+    "is_legacy",
+]
@@ -0,0 +1,292 @@
+# ============================================================
+# cluster.py
+# Coordinator / Worker Topology (single Linux box)
+# SYMBOL UNIVERSE PARTITIONED ACROSS LOCAL PROCESSES
+# ============================================================
+#
+# Coordinator: owns the HTTP endpoints, partitions symbols, broadcasts
+#              bias pushes, merges logs / metrics / positions, and
+#              respawns dead or silent workers.
+# Worker:      a normal main.py engine (own websocket, candles, orders)
+#              restricted to its partition.
+#
+# Transport is a multiprocessing Pipe per worker (local only).
+#
+# Run:  CLUSTER_WORKERS=4 python cluster.py
+# ============================================================
+
+import os
+import time
+import threading
+import multiprocessing as mp
+
+from sector_mapping import SECTOR_MAP
+from bias_protocol import LegacyAdapter, is_legacy
+
+
+HEARTBEAT_SEC = 5
+HEARTBEAT_TIMEOUT = 30
+RESPAWN_BACKOFF = (1, 2, 5, 10, 30)
+IST_OFFSET = 19800
+
+
+def _ist_day(ts):
+    return (int(ts) + IST_OFFSET) // 86400
+
+
+# ------------------------------------------------------------
+# PARTITIONING
+# ------------------------------------------------------------
+def partition_symbols(symbols, n):
+    parts = [[] for _ in range(n)]
+    for i, s in enumerate(sorted(set(symbols))):
+        parts[i % n].append(s)
+    return parts
+
+
+# ------------------------------------------------------------
+# WORKER PROCESS
+# ------------------------------------------------------------
+def _positions(main):
+    out = {}
+    for st in main.STRATEGIES:
+        orders = st.snapshot()["orders"]
+        if orders: out[st.name] = orders
+    return out
+
+
+def worker_main(wid, symbols, conn, n_workers):
+    send_lock = threading.Lock()
+
+    def send(msg):
+        with send_lock:
+            try:
+                conn.send(msg)
+            except (OSError, EOFError):
+                pass
+
+    # Read by main at import: the account-wide Fyers budget is split N ways,
+    # and per-worker files (tick recording, ...) are tagged .w<wid>
+    os.environ["CLUSTER_WORKER_COUNT"] = str(n_workers)
+    os.environ["CLUSTER_WORKER_ID"] = str(wid)
+    import main
+
+    def exit_now():
+        # os._exit skips atexit: flush the tick recording first
+        if main.RECORDER is not None: main.RECORDER.close()
+        os._exit(0)
+
+    main.LOG_SINK = lambda level, msg: send(("log", wid, level, msg))
+    main.start_engine(symbols)
+
+    def commands():
+        # Bias pushes can block on history fetches; keep them off the heartbeat loop
+        while True:
+            try:
+                cmd, payload = conn.recv()
+            except (OSError, EOFError):
+                exit_now()
+
+            if cmd == "bias":
+                main.apply_bias(payload)
+            elif cmd == "stop":
+                exit_now()
+
+    threading.Thread(target=commands, daemon=True).start()
+
+    while True:
+        send(("metrics", wid, {
+            "startup": main.STARTUP_TIMINGS,
+            "tick_queue": main.tick_queue.qsize(),
+            "lanes": main.tick_queue.snapshot(),
+            "symbols": len(main.ALL_SYMBOLS),
+            "active": len(main.BIAS.active),
+            "bias": {"epoch": main.BIAS.epoch, "seq": main.BIAS.seq, **main.BIAS_BOOK.stats},
+            "portfolio": main.PORTFOLIO.totals() if main.PORTFOLIO else None,
+        }))
+        send(("positions", wid, _positions(main)))
+        time.sleep(HEARTBEAT_SEC)
+
+
+# ------------------------------------------------------------
+# COORDINATOR
+# ------------------------------------------------------------
+class Coordinator:
+
+    def __init__(self, n_workers, symbols=None, log_fn=None):
+        if symbols is None:
+            symbols = {s for sector in SECTOR_MAP.values() for s in sector}
+
+        self.parts = partition_symbols(symbols, n_workers)
+        self.ctx = mp.get_context("spawn")
+        self.lock = threading.Lock()
+        self.send_lock = threading.Lock()
+        self.log_fn = log_fn or (lambda level, msg: print(f"{level} | {msg}", flush=True))
+
+        self.procs = [None] * n_workers
+        self.conns = [None] * n_workers
+        self.last_seen = [0.0] * n_workers
+        self.restarts = [0] * n_workers
+
+        self.metrics = {}
+        self.positions = {}
+        self.legacy = LegacyAdapter()
+        self.bias_epoch = None
+        self.bias_log = {}     # seq → payload for the current epoch, replayed on respawn (same IST day only)
+        self.stopping = False
+
+    # ---------------- LIFECYCLE ----------------
+    def start(self):
+        for wid in range(len(self.parts)):
+            self._spawn(wid)
+        threading.Thread(target=self._monitor, daemon=True).start()
+
+    def stop(self):
+        self.stopping = True
+        for wid in range(len(self.conns)):
+            self._send(wid, ("stop", None))
+        for p in self.procs:
+            if p: p.join(timeout=5)
+
+    def _spawn(self, wid):
+        parent, child = self.ctx.Pipe()
+        p = self.ctx.Process(target=worker_main, args=(wid, self.parts[wid], child, len(self.parts)), daemon=True)
+        p.start()
+        child.close()
+
+        with self.lock:
+            self.procs[wid] = p
+            self.conns[wid] = parent
+            self.last_seen[wid] = time.time()
+            if self.bias_epoch is not None and _ist_day(self.bias_epoch) != _ist_day(time.time()):
+                # yesterday's selection: a worker respawned before today's first push starts empty
+                self.bias_epoch, self.bias_log = None, {}
+            replay = [self.bias_log[k] for k in sorted(self.bias_log)]
+
+        threading.Thread(target=self._reader, args=(wid, parent), daemon=True).start()
+
+        for payload in replay:
+            self._send(wid, ("bias", payload))
+
+        self.log_fn("CLUSTER", f"W{wid} started pid={p.pid} symbols={len(self.parts[wid])}")
+
+    def _monitor(self):
+        while True:
+            time.sleep(HEARTBEAT_SEC)
+            if self.stopping: return
+            now = time.time()
+            for wid, p in enumerate(self.procs):
+                silent = now - self.last_seen[wid] > HEARTBEAT_TIMEOUT
+                if p.is_alive() and not silent:
+                    continue
+
+                self.log_fn("CLUSTER", f"W{wid} {'silent' if p.is_alive() else 'dead'} (exit={p.exitcode}), reassigning {len(self.parts[wid])} symbols")
+                if p.is_alive(): p.terminate()
+                p.join(timeout=5)
+
+                with self.lock:
+                    self.metrics.pop(wid, None)
+                    self.positions.pop(wid, None)
+
+                n = self.restarts[wid]
+                self.restarts[wid] += 1
+                time.sleep(RESPAWN_BACKOFF[min(n, len(RESPAWN_BACKOFF) - 1)])
+                self._spawn(wid)
+
+    # ---------------- TRANSPORT ----------------
+    def _send(self, wid, msg):
+        conn = self.conns[wid]
+        try:
+            with self.send_lock:
+                conn.send(msg)
+        except (OSError, EOFError, AttributeError):
+            pass   # monitor respawns and replays bias
+
+    def _reader(self, wid, conn):
+        while True:
+            try:
+                kind, src, *rest = conn.recv()
+            except (OSError, EOFError):
+                return
+
+            self.last_seen[wid] = time.time()
+
+            if kind == "log":
+                level, msg = rest
+                self.log_fn(level, f"W{src} | {msg}")
+            elif kind == "metrics":
+                with self.lock: self.metrics[src] = rest[0]
+            elif kind == "positions":
+                with self.lock: self.positions[src] = rest[0]
+
+    # ---------------- BIAS BROADCAST ----------------
+    def broadcast_bias(self, payload):
+        # Legacy batches are numbered here, once, so every worker sees the same seq
+        payload = dict(payload)
+        with self.lock:
+            if is_legacy(payload):
+                if payload.get("is_first_batch"):
+                    payload.setdefault("bias_ts", int(time.time()))
+                payload = self.legacy.convert(payload)
+            epoch = payload["epoch"]
+            if self.bias_epoch is None or epoch > self.bias_epoch:
+                self.bias_epoch, self.bias_log = epoch, {}
+            if epoch == self.bias_epoch:
+                self.bias_log.setdefault(payload["seq"], payload)
+
+        for wid in range(len(self.procs)):
+            self._send(wid, ("bias", payload))
+
+    # ---------------- MERGED VIEWS ----------------
+    def merged_metrics(self):
+        with self.lock:
+            workers = dict(self.metrics)
+        return {
+            "workers": workers,
+            "restarts": list(self.restarts),
+            "tick_queue": sum(m.get("tick_queue", 0) for m in workers.values()),
+            "active": sum(m.get("active", 0) for m in workers.values()),
+        }
+
+    def merged_positions(self):
+        out = {}
+        with self.lock:
+            snap = list(self.positions.values())
+        for per_worker in snap:
+            for name, book in per_worker.items():
+                out.setdefault(name, {}).update(book)
+        return out
+
+
+# ------------------------------------------------------------
+# COORDINATOR APP
+# ------------------------------------------------------------
+def create_coordinator_app(n_workers=None):
+    from flask import Flask, jsonify, request
+    import main
+
+    n = n_workers or int(os.getenv("CLUSTER_WORKERS", 2))
+    coord = Coordinator(n, log_fn=main.log)
+    coord.start()
+
+    app = Flask(__name__)
+
+    @app.route("/push-sector-bias", methods=["POST"])
+    def receive_bias():
+        coord.broadcast_bias(request.get_json(force=True))
+        return jsonify({"status": "received"})
+
+    @app.route("/")
+    def health(): return jsonify({"status": "ok", "workers": n})
+
+    @app.route("/metrics")
+    def metrics(): return jsonify(coord.merged_metrics())
+
+    @app.route("/positions")
+    def positions(): return jsonify(coord.merged_positions())
+
+    return app
+
+
+if __name__ == "__main__":
+    create_coordinator_app().run(host="0.0.0.0", port=int(os.environ.get("PORT", 10000)))
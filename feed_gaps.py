@@ -0,0 +1,159 @@
+# ============================================================
+# feed_gaps.py
+# Feed Gap Detection + Candle Repair Bookkeeping
+# NO SIGNAL FROM A CANDLE BUILT ON MISSING TICKS
+# ============================================================
+#
+# A gap opens on a websocket reconnect (all active symbols) or when
+# one symbol goes stale. It closes at the symbol's next tick. Every
+# candle bucket the gap touched is marked dirty.
+#
+# A closing candle with a dirty bucket at or before it is held, along
+# with every later close for that symbol, until history backfill for
+# those buckets arrives. The repaired candles are then evaluated in
+# order. If the backfill fails, their signals are suppressed.
+#
+# Pure bookkeeping: the engine (main.py) owns threads and I/O and
+# calls in from its single tick worker.
+# ============================================================
+
+import time
+
+
+class GapTracker:
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.open_gaps = {}    # symbol → (last good feed ts, detected at)
+        self.dirty = {}        # symbol → set(bucket start)
+        self.held = {}         # symbol → [(candle, raw_vol)]
+        self.detected = {}     # symbol → earliest detection (wall) not yet repaired
+        self.inflight = set()
+
+        self.stats = {
+            "gaps": 0, "reconnects": 0, "held": 0, "repaired": 0,
+            "filled": 0, "suppressed": 0, "corrected": 0,
+            "recovery_ms_max": 0.0, "recovery_ms_last": 0.0,
+        }
+
+    def _bucket(self, ts):
+        return ts - (ts % self.interval)
+
+    # ---------------- DETECTION ----------------
+    def open(self, symbol, since):
+        if symbol in self.open_gaps or since is None:
+            return
+        now = time.time()
+        self.open_gaps[symbol] = (since, now)
+        self.detected.setdefault(symbol, now)
+        self.stats["gaps"] += 1
+
+    def on_tick(self, symbol, ts):
+        since, _ = self.open_gaps.pop(symbol)
+        dirty = self.dirty.setdefault(symbol, set())
+        b = self._bucket(since)
+        while b <= ts:
+            dirty.add(b)
+            b += self.interval
+
+    # ---------------- HOLD ----------------
+    def should_hold(self, symbol, start):
+        if symbol in self.held:
+            return True
+        dirty = self.dirty.get(symbol)
+        return bool(dirty) and min(dirty) <= start
+
+    def hold(self, symbol, c, raw_vol):
+        """Returns a (range_from, range_to) history request, or None if one is in flight."""
+        self.held.setdefault(symbol, []).append((c, raw_vol))
+        self.stats["held"] += 1
+        return self.request(symbol)
+
+    def request(self, symbol):
+        if symbol in self.inflight or not self.held.get(symbol):
+            return None
+        self.inflight.add(symbol)
+        first = min(min(self.dirty.get(symbol) or {self.held[symbol][0][0].start}),
+                    self.held[symbol][0][0].start)
+        last = self.held[symbol][-1][0].start
+        return first, last + self.interval - 1
+
+    # ---------------- REPAIR ----------------
+    def apply(self, symbol, hist, range_to):
+        """
+        hist: {bucket start: (o, h, l, c, v)} or None when backfill failed.
+        Returns ordered actions for the engine:
+          ("fill", start, vol)            bucket with no live candle
+          ("eval", candle, vol, raw_vol, signal)   signal=False → suppressed
+        """
+        self.inflight.discard(symbol)
+        dirty = self.dirty.get(symbol, set())
+        held = self.held.get(symbol, [])
+
+        now_held = [h for h in held if h[0].start <= range_to]
+        rest = [h for h in held if h[0].start > range_to]
+        live_starts = {c.start for c, _ in now_held}
+
+        actions = []
+        if hist is not None:
+            for start in sorted(b for b in dirty if b <= range_to and b not in live_starts):
+                if start in hist:
+                    actions.append((start, 0, ("fill", start, hist[start][4])))
+                    self.stats["filled"] += 1
+
+        for c, raw_vol in now_held:
+            vol, signal = raw_vol, True
+            if c.start in dirty:
+                bar = hist.get(c.start) if hist is not None else None
+                if bar is None:
+                    signal = False
+                    self.stats["suppressed"] += 1
+                else:
+                    o, h, l, cl, v = bar
+                    c.open, c.close = o, cl
+                    if h > c.high: c.high = h
+                    if l < c.low: c.low = l
+                    vol = v
+                    self.stats["repaired"] += 1
+            actions.append((c.start, 1, ("eval", c, vol, raw_vol, signal)))
+
+        for b in [b for b in dirty if b <= range_to]:
+            dirty.discard(b)
+        if not dirty:
+            self.dirty.pop(symbol, None)
+
+        if rest:
+            self.held[symbol] = rest
+        else:
+            self.held.pop(symbol, None)
+            t = self.detected.pop(symbol, None)
+            if t is not None and symbol not in self.open_gaps:
+                ms = round((time.time() - t) * 1000, 1)
+                self.stats["recovery_ms_last"] = ms
+                if ms > self.stats["recovery_ms_max"]:
+                    self.stats["recovery_ms_max"] = ms
+
+        actions.sort(key=lambda a: (a[0], a[1]))
+        return [a[2] for a in actions]
+
+    def mark_corrected(self):
+        self.stats["corrected"] += 1
+
+    def release(self, symbols):
+        for s in symbols:
+            self.open_gaps.pop(s, None)
+            self.dirty.pop(s, None)
+            self.held.pop(s, None)
+            self.detected.pop(s, None)
+
+
+def parse_history(res):
+    if not res or res.get("s") != "ok":
+        return None
+    return {int(row[0]): tuple(row[1:6]) for row in res.get("candles", [])}
+
+
+__all__ = [
+    "GapTracker",
+    "parse_history",
+]
@@ -0,0 +1,274 @@
+# ============================================================
+# fyers_gateway.py
+# Single Rate-Limited Facade For Every Fyers Call
+# ORDERS > HISTORY > SUBSCRIPTIONS
+# ============================================================
+#
+# Every REST / websocket call goes through one FyersGateway so that
+# all callers share the same budgets:
+#   - per-endpoint token buckets
+#   - shared account-wide buckets (per second + per minute)
+#   - priority: a waiting order call blocks lower classes from taking
+#     shared tokens until it has been served
+#
+# Drop-in: exposes place_order / cancel_order / history / subscribe /
+# unsubscribe with the same arguments as the SDK objects it wraps.
+# ============================================================
+
+import time
+import threading
+
+
+# ------------------------------------------------------------
+# BUDGETS
+# ------------------------------------------------------------
+ORDER, HISTORY, SUBSCRIPTION = 0, 1, 2
+CLASS_NAMES = {ORDER: "order", HISTORY: "history", SUBSCRIPTION: "subscription"}
+
+# endpoint → (priority class, rate per sec, burst)
+ENDPOINTS = {
+    "place_order": (ORDER, 10, 10),
+    "cancel_order": (ORDER, 10, 10),
+    "history": (HISTORY, 5, 5),
+    "subscribe": (SUBSCRIPTION, 1 / 0.7, 1),
+    "unsubscribe": (SUBSCRIPTION, 10, 1),
+}
+
+# Account-wide REST limits (rate per sec, burst)
+SHARED_LIMITS = ((10, 10), (200 / 60, 200))
+
+THROTTLE_PENALTY_SEC = 1.0
+UNPACED_RATE = 1e9   # "no pacing" without an infinite rate in the bucket math
+
+# Fyers' rate-limit reply: {"s": "error", "code": 429, "message": "request limit reached"}.
+# Matched on these only; other errors that mention a limit (circuit
+# limit, limit price) are broker rejections, not throttles.
+THROTTLE_CODES = (429, -429)
+THROTTLE_MESSAGES = ("request limit reached", "too many requests", "rate limit")
+
+
+class TokenBucket:
+
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.ts = time.monotonic()
+
+    def _fill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+
+    def wait_time(self, now):
+        self._fill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def drain(self, seconds):
+        self.tokens = -seconds * self.rate
+
+
+def split_limits(limits, n):
+    """
+    Per-process share of account-wide limits when n processes trade
+    one account (cluster.py workers). Burst never drops below 1.
+    """
+    if n <= 1:
+        return limits
+    return tuple((rate / n, max(1.0, burst / n)) for rate, burst in limits)
+
+
+def pace_rate(delay):
+    """Calls per second for a minimum delay between calls; 0 → unpaced."""
+    return 1 / delay if delay > 0 else UNPACED_RATE
+
+
+def _is_throttled(res):
+    if not isinstance(res, dict) or res.get("s") != "error":
+        return False
+    if res.get("code") in THROTTLE_CODES:
+        return True
+    msg = str(res.get("message", "")).lower()
+    return any(m in msg for m in THROTTLE_MESSAGES)
+
+
+# ------------------------------------------------------------
+# GATEWAY
+# ------------------------------------------------------------
+class FyersGateway:
+
+    def __init__(self, rest=None, ws=None, endpoints=ENDPOINTS, shared=SHARED_LIMITS):
+        self.rest = rest
+        self.ws = ws
+
+        self.cond = threading.Condition()
+        self.classes = {ep: cfg[0] for ep, cfg in endpoints.items()}
+        self.buckets = {ep: TokenBucket(cfg[1], cfg[2]) for ep, cfg in endpoints.items()}
+        self.shared = [TokenBucket(r, b) for r, b in shared]
+        self.waiting = [0, 0, 0]
+
+        self.stats = {
+            ep: {"calls": 0, "errors": 0, "throttled": 0,
+                 "wait_ms_sum": 0.0, "wait_ms_max": 0.0,
+                 "latency_ms_sum": 0.0, "latency_ms_max": 0.0}
+            for ep in endpoints
+        }
+
+    def bind(self, rest=None, ws=None):
+        if rest is not None: self.rest = rest
+        if ws is not None: self.ws = ws
+
+    # ---------------- SDK SURFACE ----------------
+    def place_order(self, data):
+        return self._call("place_order", self.rest.place_order, data)
+
+    def cancel_order(self, data):
+        return self._call("cancel_order", self.rest.cancel_order, data)
+
+    def history(self, data):
+        return self._call("history", self.rest.history, data)
+
+    def subscribe(self, symbols, data_type="SymbolUpdate"):
+        return self._call("subscribe", self.ws.subscribe, symbols=symbols, data_type=data_type)
+
+    def unsubscribe(self, symbols, data_type="SymbolUpdate"):
+        return self._call("unsubscribe", self.ws.unsubscribe, symbols=symbols, data_type=data_type)
+
+    # ---------------- SCHEDULING ----------------
+    def _acquire(self, endpoint):
+        prio = self.classes[endpoint]
+        bucket = self.buckets[endpoint]
+        rest = prio != SUBSCRIPTION   # websocket calls don't count against REST limits
+
+        with self.cond:
+            self.waiting[prio] += 1
+            try:
+                while True:
+                    if any(self.waiting[p] for p in range(prio)):
+                        # a higher class is queued; let it take shared tokens first
+                        self.cond.wait(0.05)
+                        continue
+
+                    now = time.monotonic()
+                    wait = bucket.wait_time(now)
+                    if rest:
+                        for b in self.shared:
+                            wait = max(wait, b.wait_time(now))
+
+                    if wait <= 0:
+                        bucket.take()
+                        if rest:
+                            for b in self.shared: b.take()
+                        return
+
+                    self.cond.wait(wait)
+            finally:
+                self.waiting[prio] -= 1
+                self.cond.notify_all()
+
+    def _call(self, endpoint, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        self._acquire(endpoint)
+        t1 = time.perf_counter()
+
+        res, failed = None, False
+        try:
+            res = fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            t2 = time.perf_counter()
+            wait_ms, lat_ms = (t1 - t0) * 1000, (t2 - t1) * 1000
+            throttled = _is_throttled(res)
+
+            with self.cond:
+                st = self.stats[endpoint]
+                st["calls"] += 1
+                st["errors"] += failed
+                st["wait_ms_sum"] += wait_ms
+                st["latency_ms_sum"] += lat_ms
+                if wait_ms > st["wait_ms_max"]: st["wait_ms_max"] = wait_ms
+                if lat_ms > st["latency_ms_max"]: st["latency_ms_max"] = lat_ms
+                if throttled:
+                    st["throttled"] += 1
+                    self.buckets[endpoint].drain(THROTTLE_PENALTY_SEC)
+
+        return res
+
+    # ---------------- STATS ----------------
+    def snapshot(self):
+        out = {}
+        for ep, st in self.stats.items():
+            n = st["calls"] or 1
+            out[ep] = {
+                "class": CLASS_NAMES[self.classes[ep]],
+                "calls": st["calls"],
+                "errors": st["errors"],
+                "throttled": st["throttled"],
+                "wait_ms_avg": round(st["wait_ms_sum"] / n, 2),
+                "wait_ms_max": round(st["wait_ms_max"], 2),
+                "latency_ms_avg": round(st["latency_ms_sum"] / n, 2),
+                "latency_ms_max": round(st["latency_ms_max"], 2),
+            }
+        return out
+
+
+# ------------------------------------------------------------
+# LOCAL MOCK (tests / dry runs)
+# ------------------------------------------------------------
+class MockFyers:
+    """
+    In-process stand-in for both FyersModel and FyersDataSocket.
+    Bind it as rest and ws: FyersGateway(rest=mock, ws=mock).
+    `throttle_every` returns a 429 error on every Nth REST call.
+    """
+
+    def __init__(self, latency=0.0, throttle_every=0, candles=None):
+        self.latency = latency
+        self.throttle_every = throttle_every
+        self.candles = candles or {}
+        self.calls = []
+        self.subscribed = set()
+        self._n = 0
+        self._lock = threading.Lock()
+
+    def _rest(self, name, data):
+        with self._lock:
+            self._n += 1
+            n = self._n
+            self.calls.append((name, data))
+        if self.latency: time.sleep(self.latency)
+        if self.throttle_every and n % self.throttle_every == 0:
+            return {"s": "error", "code": 429, "message": "request limit reached"}
+        return None
+
+    def place_order(self, data):
+        return self._rest("place_order", data) or {"s": "ok", "id": f"MOCK{self._n}"}
+
+    def cancel_order(self, data):
+        return self._rest("cancel_order", data) or {"s": "ok", "id": data.get("id")}
+
+    def history(self, data):
+        return self._rest("history", data) or {"s": "ok", "candles": self.candles.get(data["symbol"], [])}
+
+    def subscribe(self, symbols, data_type="SymbolUpdate"):
+        self.calls.append(("subscribe", symbols))
+        self.subscribed.update(symbols)
+
+    def unsubscribe(self, symbols, data_type="SymbolUpdate"):
+        self.calls.append(("unsubscribe", symbols))
+        self.subscribed.difference_update(symbols)
+
+
+__all__ = [
+    "FyersGateway",
+    "TokenBucket",
+    "MockFyers",
+    "ENDPOINTS",
+    "SHARED_LIMITS",
+    "split_limits",
+    "pace_rate",
+]
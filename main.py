@@ -3,194 +3,641 @@ import time
 import threading
 import requests
 from datetime import datetime
-import pytz
-from queue import Queue
-from flask import Flask, jsonify, request
-
-from fyers_apiv3 import fyersModel
-from fyers_apiv3.FyersWebsocket import data_ws
+from concurrent.futures import ThreadPoolExecutor
 
 from sector_mapping import SECTOR_MAP
-from sector_engine import SECTOR_LIST
-from signal_candle_order import handle_signal_event, handle_ltp_event, ORDER_STATE
+from strategy_engine import StrategyRouter, load_strategies
+from tick_feed import register_symbols, normalize_tick, Candle, TickLanes, FAST, NORMAL
+from fyers_gateway import FyersGateway, ENDPOINTS, SUBSCRIPTION, SHARED_LIMITS, split_limits, pace_rate
+from feed_gaps import GapTracker, parse_history
+from volume_sketch import VolumeProfile
+from session import EngineSession, ist_day
+from bias_protocol import BiasBook, LegacyAdapter, EMPTY_BIAS, NO_BIAS, is_legacy
+
+# Heavy imports (flask, fyers SDK, pytz) are deferred to first use so that
+# importing this module has no side effects. Use create_app() / start_engine().
+
+_T0 = time.perf_counter()
 
 # ================= TIME & CONFIG =================
-IST = pytz.timezone("Asia/Kolkata")
-UTC = pytz.utc
+CLUSTER_WORKER_COUNT = int(os.getenv("CLUSTER_WORKER_COUNT", 1))   # set by cluster.py in each worker
+CLUSTER_WORKER_ID = os.getenv("CLUSTER_WORKER_ID")
+WORKER_TAG = f".w{CLUSTER_WORKER_ID}" if CLUSTER_WORKER_ID is not None else ""   # per-worker file names
+
+def worker_file(path):
+    """profile.json → profile.w<N>.json under cluster.py; unchanged standalone."""
+    if not path or not WORKER_TAG: return path
+    root, ext = os.path.splitext(path)
+    return root + WORKER_TAG + ext
+
 CANDLE_INTERVAL = 300
+SUB_BATCH_SIZE = int(os.getenv("SUB_BATCH_SIZE", 50))
+SUB_BATCH_DELAY = float(os.getenv("SUB_BATCH_DELAY", 0.7))
+STALE_SEC = int(os.getenv("STALE_SEC", 60))
+STALE_CHECK_SEC = 10
+BACKFILL_WORKERS = 4
+TICK_RECORD_DIR = os.getenv("TICK_RECORD_DIR")   # record ticks + bias for backtest.py
+NORMAL_BATCH = 256   # candle-only ticks drained (and coalesced) per pass
+# Each worker only updates its own partition: one profile file per worker
+VOLUME_PROFILE_PATH = worker_file(os.getenv("VOLUME_PROFILE_PATH"))   # time-of-day rings, kept across restarts
+PROFILE_SAVE_SEC = 300
+SESSION_ARCHIVE_DIR = os.getenv("SESSION_ARCHIVE_DIR", "sessions")   # one JSON per IST day (per worker)
 
 FYERS_CLIENT_ID = os.getenv("FYERS_CLIENT_ID")
 FYERS_ACCESS_TOKEN = os.getenv("FYERS_ACCESS_TOKEN")
 WEBAPP_URL = os.getenv("WEBAPP_URL")
 
-app = Flask(__name__)
-fyers = fyersModel.FyersModel(client_id=FYERS_CLIENT_ID, token=FYERS_ACCESS_TOKEN, log_path="")
+IST = None
+fyers = None      # FyersGateway once the client is built; all calls go through it
+fyers_ws = None
+LOG_SINK = None   # cluster workers forward logs to the coordinator
 
 # ================= STATE =================
 ALL_SYMBOLS = sorted(set(s for sector in SECTOR_MAP.values() for s in sector))
-ACTIVE_SYMBOLS = set()
-BIAS_DONE = False
+register_symbols(ALL_SYMBOLS)
+FEED_ACCEPT = frozenset(ALL_SYMBOLS)
+UNIVERSE = FEED_ACCEPT
+DRAINING = frozenset()   # dropped from the active set with live orders: tracked until flat
 BT_FLOOR_TS = None
-STOCK_BIAS_MAP = {}
 
-candles = {}
-last_base_vol = {}
-last_ws_base_before_bias = {}
-volume_history = {}
-signal_counter = {}
-
-tick_queue = Queue(maxsize=15000)
+# Active set + per-symbol bias: one immutable snapshot, replaced whole
+# by apply_bias(). Readers take `BIAS` once and use that object.
+BIAS = EMPTY_BIAS
+BIAS_BOOK = BiasBook()
+LEGACY_BIAS = LegacyAdapter()
+_bias_lock = threading.Lock()   # ingest side only; the tick path never takes it
+
+# Per-day containers live on SESSION; these names are hot-path aliases
+# rebound by _bind_session() after a rollover (release pops in place).
+SESSION = EngineSession(ist_day())
+
+def _bind_session():
+    global candles, last_base_vol, last_ws_base_before_bias, volume_history, last_tick_ts
+    candles, last_base_vol = SESSION.candles, SESSION.last_base_vol
+    last_ws_base_before_bias, volume_history = SESSION.last_ws_base_before_bias, SESSION.volume_history
+    last_tick_ts = SESSION.last_tick_ts
+
+_bind_session()
+
+VOLUME_PROFILE = VolumeProfile(CANDLE_INTERVAL, path=VOLUME_PROFILE_PATH)
+
+GAPS = GapTracker(CANDLE_INTERVAL)
+BACKFILL_POOL = ThreadPoolExecutor(max_workers=BACKFILL_WORKERS, thread_name_prefix="backfill")
+_ws_connected_once = False
+RECORDER = None
+PORTFOLIO = None   # numpy-backed position view, built by start_engine()
+
+tick_queue = TickLanes(maxsize=15000)
+
+# ================= STARTUP (Lazy Init + Phase Timing) =================
+STARTUP_TIMINGS = {}
+_engine_lock = threading.Lock()
+_engine_started = False
+
+# Cluster workers share one account: each gets 1/N of the account-wide budget
+GATEWAY = FyersGateway(endpoints={**ENDPOINTS, "subscribe": (SUBSCRIPTION, pace_rate(SUB_BATCH_DELAY), 1)},
+                       shared=split_limits(SHARED_LIMITS, CLUSTER_WORKER_COUNT))
+
+def _mark(phase, t0):
+    STARTUP_TIMINGS[phase] = round((time.perf_counter() - t0) * 1000, 1)
+
+def get_ist():
+    global IST
+    if IST is None:
+        import pytz
+        IST = pytz.timezone("Asia/Kolkata")
+    return IST
+
+def get_fyers():
+    global fyers
+    if fyers is None:
+        t0 = time.perf_counter()
+        from fyers_apiv3 import fyersModel
+        GATEWAY.bind(rest=fyersModel.FyersModel(client_id=FYERS_CLIENT_ID, token=FYERS_ACCESS_TOKEN, log_path=""))
+        fyers = GATEWAY
+        _mark("fyers_client_ms", t0)
+    return fyers
 
 # ================= LOGGING (Debug Enabled) =================
 def log(level, msg):
-    ts = datetime.now(IST).strftime("%H:%M:%S")
+    if LOG_SINK is not None:
+        LOG_SINK(level, msg)
+        return
+    ts = datetime.now(get_ist()).strftime("%H:%M:%S")
     print(f"[{ts}] {level} | {msg}", flush=True)
     try:
         requests.post(WEBAPP_URL, json={"action": "pushLog", "payload": {"level": level, "message": msg}}, timeout=2)
     except: pass
 
+# ================= STRATEGIES =================
+STRATEGIES = load_strategies(log)
+ROUTER = StrategyRouter(STRATEGIES)
+
 # ================= CANDLE ENGINE (Stable Logic) =================
-def close_live_candle(symbol, c):
+def close_live_candle(symbol, c, bias):
     prev_base = last_base_vol.get(symbol)
-    if prev_base is None: return
+    if prev_base is None:
+        # no pre-selection tick (subscribed at final): the first candle is partial
+        last_base_vol[symbol] = c.base_vol
+        return
+
+    candle_vol = c.base_vol - prev_base
+    last_base_vol[symbol] = c.base_vol
 
-    candle_vol = c["base_vol"] - prev_base
-    last_base_vol[symbol] = c["base_vol"]
+    # Candle touched a feed gap → hold until history repairs it
+    if GAPS.should_hold(symbol, c.start):
+        req = GAPS.hold(symbol, c, candle_vol)
+        if req: request_backfill(symbol, *req)
+        return
+
+    evaluate_candle(symbol, c, candle_vol, bias)
 
+def evaluate_candle(symbol, c, candle_vol, snap, signal=True):
     volume_history.setdefault(symbol, []).append(candle_vol)
     prev_min = min(volume_history[symbol][:-1]) if len(volume_history[symbol]) > 1 else None
     is_lowest = prev_min is not None and candle_vol < prev_min
+    below_session, below_tod = VOLUME_PROFILE.check(symbol, c.start, candle_vol)
 
-    color = "RED" if c["open"] > c["close"] else "GREEN" if c["open"] < c["close"] else "DOJI"
-    bias = STOCK_BIAS_MAP.get(symbol, "")
+    color = "RED" if c.open > c.close else "GREEN" if c.open < c.close else "DOJI"
+    bias, breadth = snap.bias.get(symbol, NO_BIAS)
     
-    offset = (c["start"] - BT_FLOOR_TS) // CANDLE_INTERVAL
+    offset = (c.start - BT_FLOOR_TS) // CANDLE_INTERVAL
     label = f"LIVE{offset + 3}"
 
-    log("VOLCHK", f"{symbol} | {label} | V={round(candle_vol,1)} | lowest={is_lowest} | {color} {bias}")
-
-    # SIGNAL TRIGGER LOGIC
-    if is_lowest:
-        state = ORDER_STATE.get(symbol)
-        if state and state.get("status") == "PENDING":
-            handle_signal_event(fyers=fyers, symbol=symbol, side=None, log_fn=lambda m: log("ORDER", m))
+    log("VOLCHK", f"{symbol} | {label} | V={round(candle_vol,1)} | lowest={is_lowest} p10s={below_session} p10t={below_tod} | {color} {bias}")
 
-        if (bias == "B" and color == "RED") or (bias == "S" and color == "GREEN"):
-            sc = signal_counter.get(symbol, 0) + 1
-            signal_counter[symbol] = sc
-            side = "BUY" if bias == "B" else "SELL"
-            handle_signal_event(fyers=fyers, symbol=symbol, side=side, high=c["high"], low=c["low"], 
-                                per_trade_risk=float(os.getenv("PER_TRADE_RISK", 500)), mode="PAPER", signal_no=sc, log_fn=lambda m: log("ORDER", m))
+    if not signal:
+        log("GAP", f"{symbol} | {label} | signal suppressed (backfill failed)")
+        return
 
-def update_candle(msg):
-    symbol, ltp, base_vol, ts = msg.get("symbol"), msg.get("ltp"), msg.get("vol_traded_today"), msg.get("exch_feed_time")
-    if not all([symbol, ltp, base_vol, ts]): return
+    # SIGNAL TRIGGER LOGIC (fan-out to every strategy)
+    flags = {"lowest": is_lowest, "session_p10": below_session, "tod_p10": below_tod}
+    ROUTER.on_candle_close(fyers, symbol, c, volume_flags=flags, color=color,
+                           bias=bias, breadth=breadth)
 
-    if not BIAS_DONE:
+def update_candle(symbol, ltp, base_vol, ts):
+    bias = BIAS
+    if not bias.done:
         last_ws_base_before_bias[symbol] = base_vol
+        # re-selection pending: open orders are still tracked
+        if symbol in ROUTER.ltp_routes: track_orders(symbol, ltp, ts, bias)
+        return
+
+    if symbol not in bias.active:
+        if symbol in DRAINING: track_orders(symbol, ltp, ts, bias)
         return
 
-    if symbol not in ACTIVE_SYMBOLS: return
+    # Older than what the other lane already applied (lane switch)
+    if ts < last_tick_ts.get(symbol, 0): return
+
+    if symbol in GAPS.open_gaps: GAPS.on_tick(symbol, ts)
+    last_tick_ts[symbol] = ts
 
-    # LTP Event for Order Tracking
-    handle_ltp_event(fyers=fyers, symbol=symbol, ltp=ltp, mode="PAPER", log_fn=lambda m: log("ORDER", m))
+    # LTP Event for Order Tracking (only strategies with live state)
+    ROUTER.on_ltp(fyers, symbol, ltp)
 
     start = ts - (ts % CANDLE_INTERVAL)
     c = candles.get(symbol)
 
-    if c is None or c["start"] != start:
-        if c: close_live_candle(symbol, c)
-        candles[symbol] = {"start": start, "open": ltp, "high": ltp, "low": ltp, "close": ltp, "base_vol": base_vol}
+    if c is None or start > c.start:
+        if c: close_live_candle(symbol, c, bias)
+        candles[symbol] = Candle(start, ltp, base_vol)
+        return
+    if start < c.start: return   # late tick from the other lane
+    if base_vol < c.base_vol: return   # same-second reorder: cumulative volume never falls
+
+    if ltp > c.high: c.high = ltp
+    elif ltp < c.low: c.low = ltp
+    c.close, c.base_vol = ltp, base_vol
+
+def track_orders(symbol, ltp, ts, bias):
+    """
+    Orders without candles: a DRAINING symbol, or any routed symbol while
+    a re-selection is pending. DRAINING ones retire once every strategy
+    is flat.
+    """
+    if ts < last_tick_ts.get(symbol, 0): return
+    last_tick_ts[symbol] = ts
+    ROUTER.on_ltp(fyers, symbol, ltp)
+    if symbol in DRAINING and symbol not in ROUTER.ltp_routes and symbol not in bias.active:
+        retire_symbols([symbol])
+
+def update_candle_span(symbol, first, hi, lo, last, base_vol, ts):
+    """
+    Coalesced run of same-bucket ticks from the normal lane. Candle
+    only: drain_normal never coalesces a symbol with order state.
+    """
+    bias = BIAS
+    if not bias.done:
+        last_ws_base_before_bias[symbol] = base_vol
         return
 
-    c["high"], c["low"], c["close"], c["base_vol"] = max(c["high"], ltp), min(c["low"], ltp), ltp, base_vol
+    if symbol not in bias.active: return
 
-def tick_worker():
+    # Older than what the other lane already applied (lane switch)
+    if ts < last_tick_ts.get(symbol, 0): return
+
+    if symbol in GAPS.open_gaps: GAPS.on_tick(symbol, ts)
+    last_tick_ts[symbol] = ts
+
+    start = ts - (ts % CANDLE_INTERVAL)
+    c = candles.get(symbol)
+
+    if c is None or start > c.start:
+        if c: close_live_candle(symbol, c, bias)
+        c = candles[symbol] = Candle(start, first, base_vol)
+    elif start < c.start or base_vol < c.base_vol: return
+
+    if hi > c.high: c.high = hi
+    if lo < c.low: c.low = lo
+    c.close, c.base_vol = last, base_vol
+
+# ================= GAP REPAIR (Backfill) =================
+def request_backfill(symbol, range_from, range_to):
+    BACKFILL_POOL.submit(_backfill, symbol, range_from, range_to)
+
+def _backfill(symbol, range_from, range_to):
+    try:
+        res = GATEWAY.history({"symbol": symbol, "resolution": str(CANDLE_INTERVAL // 60), "date_format": "0",
+                               "range_from": range_from, "range_to": range_to, "cont_flag": "1"})
+        hist = parse_history(res)
+    except Exception as e:
+        log("GAP", f"{symbol} | backfill failed: {e}")
+        hist = None
+    # Back onto the tick worker so engine state has a single writer
+    tick_queue.put(lambda: apply_backfill(symbol, hist, range_to))
+
+def apply_backfill(symbol, hist, range_to):
+    bias = BIAS
+    for action in GAPS.apply(symbol, hist, range_to):
+        if action[0] == "fill":
+            volume_history.setdefault(symbol, []).append(action[2])
+            VOLUME_PROFILE.check(symbol, action[1], action[2])
+            continue
+
+        _, c, vol, raw_vol, signal = action
+        prev = volume_history.get(symbol)
+        if signal and vol != raw_vol and prev:
+            prev_min = min(prev)
+            if (raw_vol < prev_min) != (vol < prev_min): GAPS.mark_corrected()
+        evaluate_candle(symbol, c, vol, bias, signal=signal)
+
+    req = GAPS.request(symbol)
+    if req: request_backfill(symbol, *req)
+    else: log("GAP", f"{symbol} | repaired | {GAPS.stats}")
+
+def on_reconnect():
+    GAPS.stats["reconnects"] += 1
+    for s in BIAS.active:
+        GAPS.open(s, last_tick_ts.get(s))
+    log("GAP", f"WS reconnect: gaps opened for {len(GAPS.open_gaps)} symbols")
+
+def scan_stale():
+    bias = BIAS
+    if not bias.done: return
+    now = time.time()
+    for s in bias.active:
+        t = last_tick_ts.get(s)
+        if t and now - t > STALE_SEC:
+            GAPS.open(s, t)
+
+def stale_watchdog():
+    last_save = time.monotonic()
     while True:
-        update_candle(tick_queue.get())
+        time.sleep(STALE_CHECK_SEC)
+        tick_queue.put(scan_stale)
+        tick_queue.put(check_rollover)
+        if RECORDER is not None: RECORDER.flush()   # bound what a crash can lose
+        if VOLUME_PROFILE_PATH and time.monotonic() - last_save >= PROFILE_SAVE_SEC:
+            tick_queue.put(VOLUME_PROFILE.save_async)   # copy on the tick worker, write off it
+            last_save = time.monotonic()
+
+def drain_normal():
+    normal, record = tick_queue.normal, tick_queue.record
+    spans = {}   # symbol → [first, hi, lo, last, base_vol, ts, bucket]
+
+    for _ in range(min(NORMAL_BATCH, len(normal))):
+        symbol, ltp, base_vol, ts, t_in = normal.popleft()
+        record(NORMAL, t_in)
+        bucket = ts - (ts % CANDLE_INTERVAL)
+        routed = symbol in ROUTER.ltp_routes
+
+        sp = spans.get(symbol)
+        if sp is not None:
+            if sp[6] == bucket and not routed:
+                if ltp > sp[1]: sp[1] = ltp
+                elif ltp < sp[2]: sp[2] = ltp
+                sp[3], sp[4], sp[5] = ltp, base_vol, ts
+                continue
+            del spans[symbol]
+            update_candle_span(symbol, *sp[:6])
+            routed = symbol in ROUTER.ltp_routes   # that close may have placed an order
+
+        # Order state appeared while these ticks were queued: every tick
+        # goes through the fast-lane path, uncoalesced, so no trigger / SL
+        # crossing inside a span is lost
+        if routed: update_candle(symbol, ltp, base_vol, ts)
+        else: spans[symbol] = [ltp, ltp, ltp, ltp, base_vol, ts, bucket]
+
+    for symbol, sp in spans.items():
+        update_candle_span(symbol, *sp[:6])
 
-threading.Thread(target=tick_worker, daemon=True).start()
+def tick_worker():
+    lanes = tick_queue
+    control, fast, normal, record = lanes.control, lanes.fast, lanes.normal, lanes.record
+    while True:
+        if control:
+            event = control.popleft()   # backfill result, reconnect, stale scan
+            try: event()
+            except Exception as e:
+                # the worker is the only engine thread: report and keep going
+                log("DEBUG_ERR", f"control event {getattr(event, '__name__', event)} failed: {e!r}")
+        elif fast:
+            symbol, ltp, base_vol, ts, t_in = fast.popleft()
+            record(FAST, t_in)
+            update_candle(symbol, ltp, base_vol, ts)
+        elif normal:
+            drain_normal()
+        else:
+            lanes.wait()
+
+# ================= SESSION (IST Day Rollover) =================
+def run_on_worker(fn):
+    """Run fn on the tick worker (single writer of engine state) and wait."""
+    if not _engine_started: return fn()
+    done = threading.Event()
+    def job():
+        try: fn()
+        except Exception as e: log("SESSION", f"{getattr(fn, '__name__', fn)} failed: {e}")
+        finally: done.set()
+    tick_queue.put(job)
+    done.wait()
+
+def check_rollover():
+    day = ist_day()
+    if day != SESSION.day: rollover(day)
+
+def rollover(day):
+    global SESSION, GAPS, BIAS, BIAS_BOOK, LEGACY_BIAS, BT_FLOOR_TS, FEED_ACCEPT, DRAINING
+    old = SESSION
+    live = {st.name: st.live_symbols() for st in STRATEGIES if st.live_symbols()}
+    if live: log("SESSION", f"{old.day} | rollover with live order state (archived, not carried): {live}")
+
+    if SESSION_ARCHIVE_DIR:
+        try:
+            path = old.archive(SESSION_ARCHIVE_DIR, STRATEGIES, {"bias": BIAS.to_dict(), "gaps": GAPS.stats, "fyers": GATEWAY.snapshot(),
+                                 "portfolio": PORTFOLIO.totals() if PORTFOLIO else None}, tag=WORKER_TAG)
+            log("SESSION", f"{old.day} | archived to {path}")
+        except OSError as e:
+            log("SESSION", f"{old.day} | archive failed: {e}")
+
+    if RECORDER is not None: RECORDER.flush()
+    SESSION = EngineSession(day)
+    _bind_session()
+    ROUTER.reset()
+    GAPS = GapTracker(CANDLE_INTERVAL)
+    VOLUME_PROFILE.roll_day()
+    with _bias_lock:
+        BIAS, BIAS_BOOK, LEGACY_BIAS = EMPTY_BIAS, BiasBook(), LegacyAdapter()
+    BT_FLOOR_TS = None
+
+    # Yesterday's unsubscribe left only its active symbols on the socket
+    resubscribe = FEED_ACCEPT != UNIVERSE
+    FEED_ACCEPT, DRAINING = UNIVERSE, frozenset()
+    if resubscribe and fyers_ws is not None:
+        threading.Thread(target=subscribe_symbols, args=(sorted(UNIVERSE),), daemon=True).start()
+    log("SESSION", f"New session {day} (previous {old.day}: {old.sizes()})")
+
+def release_symbols(symbols):
+    """Unsubscribed for the rest of the day: free their per-symbol state."""
+    SESSION.release(symbols)
+    ROUTER.release(symbols)
+    GAPS.release(symbols)
+    VOLUME_PROFILE.release(symbols)
+
+def accept_symbols(symbols):
+    """Tick worker: put symbols (back) on the feed."""
+    global FEED_ACCEPT
+    FEED_ACCEPT = FEED_ACCEPT | frozenset(symbols)
+
+def set_feed(active):
+    """Tick worker, selection final: keep `active` on the feed, retire the rest."""
+    global DRAINING
+    DRAINING = DRAINING - active   # selected again: back to full candle tracking
+    retire_symbols(sorted(FEED_ACCEPT - active - DRAINING))
+
+def retire_symbols(symbols):
+    """
+    Off the active set. Flat symbols are released and unsubscribed now;
+    ones with live order state (entry / SL / trail) stay on the feed and
+    in the tick path as DRAINING until track_orders() sees them go flat.
+    """
+    global FEED_ACCEPT, DRAINING
+    live = [s for s in symbols if s in ROUTER.ltp_routes]
+    flat = [s for s in symbols if s not in ROUTER.ltp_routes]
+
+    fresh = [s for s in live if s not in DRAINING]
+    if fresh: log("BIAS", f"removed with live orders, tracking until flat: {fresh}")
+    DRAINING = (DRAINING | frozenset(live)) - frozenset(flat)
+    if not flat: return
+
+    FEED_ACCEPT = FEED_ACCEPT - frozenset(flat)
+    release_symbols(flat)
+    threading.Thread(target=unsubscribe_symbols, args=(sorted(flat),), daemon=True).start()
 
 # ================= WS (Cloudflare & 403 Debug) =================
 def on_message(msg):
-    try: tick_queue.put_nowait(msg)
-    except: pass
+    tick = normalize_tick(msg, FEED_ACCEPT)
+    if tick is None: return
+    if RECORDER is not None: RECORDER.tick(*tick[:4])
+    # Symbols with live order state jump the candle-only backlog
+    if tick[0] in ROUTER.ltp_routes: tick_queue.put_fast(tick)
+    else: tick_queue.put_normal(tick)
 
 def on_connect():
-    log("SYSTEM", f"DEBUG: WS CONNECTED. Attempting Throttled Sub for {len(ALL_SYMBOLS)} stocks.")
-    batch_size = 5
-    for i in range(0, len(ALL_SYMBOLS), batch_size):
-        batch = ALL_SYMBOLS[i : i + batch_size]
+    global _ws_connected_once
+    if _ws_connected_once: tick_queue.put(on_reconnect)
+    _ws_connected_once = True
+
+    t0 = time.perf_counter()
+    symbols = sorted(FEED_ACCEPT)
+    log("SYSTEM", f"DEBUG: WS CONNECTED. Attempting Throttled Sub for {len(symbols)} stocks.")
+    subscribe_symbols(symbols)
+    _mark("subscribe_ms", t0)
+    if "ready_ms" not in STARTUP_TIMINGS:
+        _mark("ready_ms", _T0)
+    log("SYSTEM", f"DEBUG: All Initial Subscriptions Attempted. Startup: {STARTUP_TIMINGS}")
+
+def subscribe_symbols(symbols):
+    for i in range(0, len(symbols), SUB_BATCH_SIZE):
+        batch = symbols[i : i + SUB_BATCH_SIZE]
         try:
-            fyers_ws.subscribe(symbols=batch, data_type="SymbolUpdate")
-            time.sleep(0.7) # Extra safe delay
+            GATEWAY.subscribe(symbols=batch, data_type="SymbolUpdate") # paced by the subscribe bucket
         except Exception as e:
             log("DEBUG_ERR", f"Subscription Batch {i} Failed: {e}")
-    log("SYSTEM", "DEBUG: All Initial Subscriptions Attempted.")
+
+def unsubscribe_symbols(symbols):
+    for i in range(0, len(symbols), 20):
+        try:
+            GATEWAY.unsubscribe(symbols=symbols[i : i + 20])
+        except Exception as e:
+            log("DEBUG_ERR", f"Unsubscribe Batch {i} Failed: {e}")
 
 def start_ws():
     global fyers_ws
+    t0 = time.perf_counter()
+    from fyers_apiv3.FyersWebsocket import data_ws
     fyers_ws = data_ws.FyersDataSocket(access_token=FYERS_ACCESS_TOKEN, on_message=on_message, on_connect=on_connect, reconnect=True)
+    GATEWAY.bind(ws=fyers_ws)
+    _mark("ws_init_ms", t0)
     fyers_ws.connect()
 
-threading.Thread(target=start_ws, daemon=True).start()
-
-# ================= RECEIVE BIAS (Batch Support) =================
-@app.route("/push-sector-bias", methods=["POST"])
-def receive_bias():
-    global BT_FLOOR_TS, STOCK_BIAS_MAP, ACTIVE_SYMBOLS, BIAS_DONE
-    data = request.get_json(force=True)
-    
-    selected = data.get("selected_stocks", [])
-    strong = data.get("strong_sectors", [])
-    is_first = data.get("is_first_batch", False)
-    is_last = data.get("is_last_batch", False)
-
-    if is_first:
+def start_engine(symbols=None):
+    """
+    Start the tick worker and websocket once per process.
+    `symbols` restricts the subscribed universe (defaults to SECTOR_MAP).
+    """
+    global _engine_started, ALL_SYMBOLS, FEED_ACCEPT, UNIVERSE, RECORDER, PORTFOLIO
+    with _engine_lock:
+        if _engine_started: return
+        _engine_started = True
+
+    if symbols is not None:
+        ALL_SYMBOLS = sorted(set(symbols))
+        register_symbols(ALL_SYMBOLS)
+        FEED_ACCEPT = UNIVERSE = frozenset(ALL_SYMBOLS)
+
+    if TICK_RECORD_DIR:
+        import atexit
+        from backtest import TickRecorder
+        RECORDER = TickRecorder(TICK_RECORD_DIR, tag=WORKER_TAG)
+        atexit.register(RECORDER.close)
+
+    t0 = time.perf_counter()
+    from portfolio import Portfolio
+    PORTFOLIO = ROUTER.portfolio = Portfolio()
+    get_fyers()
+    threading.Thread(target=tick_worker, daemon=True).start()
+    threading.Thread(target=stale_watchdog, daemon=True).start()
+    threading.Thread(target=start_ws, daemon=True).start()
+    _mark("engine_start_ms", t0)
+
+# ================= RECEIVE BIAS (Versioned Deltas) =================
+def apply_bias(data):
+    """
+    One /push-sector-bias payload (bias_protocol format, or a legacy
+    is_first/is_last batch). Ordering and repeats are handled by the
+    book; the tick path only ever sees whole snapshots.
+    """
+    global BIAS, BT_FLOOR_TS
+
+    if data.get("is_first_batch") or data.get("seq") == 1:
         log("BIAS", "DEBUG: Receiving first batch from LOCAL.")
-        ACTIVE_SYMBOLS.clear()
-        STOCK_BIAS_MAP.clear()
-        bias_ts = int(datetime.now(UTC).timestamp())
-        BT_FLOOR_TS = bias_ts - (bias_ts % CANDLE_INTERVAL)
-
-    # Map Creation
-    for s in strong:
-        key = SECTOR_LIST.get(s["sector"])
-        if key in SECTOR_MAP:
-            for sym in SECTOR_MAP[key]:
-                STOCK_BIAS_MAP[sym] = "B" if s["bias"] == "BUY" else "S"
-
-    for s in selected:
-        ACTIVE_SYMBOLS.add(s)
-        if s in last_ws_base_before_bias:
-            last_base_vol[s] = last_ws_base_before_bias[s]
-
-    if is_last:
-        BIAS_DONE = True
-        log("SYSTEM", f"DEBUG: Bias Sync Complete. Active Stocks: {len(ACTIVE_SYMBOLS)}")
-        
-        # History Fetch for C1, C2, C3
-        for s in ACTIVE_SYMBOLS:
-            res = fyers.history({"symbol": s, "resolution": "5", "date_format": "0", "range_from": BT_FLOOR_TS-900, "range_to": BT_FLOOR_TS-1, "cont_flag": "1"})
-            if res.get("s") == "ok":
-                for i, c in enumerate(res.get("candles", [])[-3:]):
-                    volume_history.setdefault(s, []).append(c[5])
-                    log("HISTORY", f"{s} | C{i+1} | V={c[5]}")
-
-        # Unsubscribe others
-        to_unsub = list(set(ALL_SYMBOLS) - ACTIVE_SYMBOLS)
-        threading.Thread(target=lambda: [fyers_ws.unsubscribe(symbols=to_unsub[i:i+20]) or time.sleep(0.1) for i in range(0, len(to_unsub), 20)]).start()
-
-    return jsonify({"status": "received"})
-
-# ================= ROUTES =================
-@app.route("/")
-def health(): return jsonify({"status": "ok"})
-
-@app.route("/fyers-redirect")
-def fyers_redirect():
-    log("SYSTEM", "FYERS redirect hit")
-    return jsonify({"status": "ok"})
+        run_on_worker(check_rollover)   # a new IST day starts from an empty session
+
+    with _bias_lock:
+        if is_legacy(data): data = LEGACY_BIAS.convert(data)
+        old = BIAS
+        status, snap = BIAS_BOOK.ingest(data, universe=UNIVERSE)
+        if snap is not old:
+            # Entering symbols start from their last pre-selection tick; at a
+            # new selection's final, so do ones subscribed after being added
+            fresh = snap.active - old.active
+            final = snap.done and not (old.done and old.epoch == snap.epoch)
+            for s in (snap.active if final else fresh):
+                if s in last_ws_base_before_bias and (s in fresh or s not in last_base_vol):
+                    last_base_vol[s] = last_ws_base_before_bias[s]
+            BT_FLOOR_TS = snap.bias_ts - (snap.bias_ts % CANDLE_INTERVAL)
+            BIAS = snap   # single reference swap: the publish
+
+    log("BIAS", f"epoch={data['epoch']} seq={data['seq']} {status} → v{snap.seq} active={len(snap.active)} done={snap.done}")
+    if status in ("duplicate", "stale"): return status
+    if RECORDER is not None: RECORDER.bias(data, int(time.time()))
+    if snap is not old: on_bias_published(old, snap)
+    return status
+
+def on_bias_published(old, new):
+    """
+    Feed side effects. Every publish: subscribe active symbols that are
+    off the feed (unsubscribed by an earlier selection today), so they
+    tick before final. Once final: seed history, retire the rest.
+    """
+    missing = sorted(new.active - FEED_ACCEPT)
+    if missing:
+        run_on_worker(lambda: accept_symbols(missing))
+        threading.Thread(target=subscribe_symbols, args=(missing,), daemon=True).start()
+    if not new.done: return
+
+    if old.done and old.epoch == new.epoch:
+        added = new.active - old.active
+    else:
+        added = new.active
+        log("SYSTEM", f"DEBUG: Bias Sync Complete. Active Stocks: {len(new.active)}")
+
+    if added: seed_history(added)
+    run_on_worker(lambda: set_feed(new.active))
+
+def seed_history(symbols):
+    # History Fetch for C1, C2, C3
+    seeds = {}
+    for s in symbols:
+        if volume_history.get(s): continue
+        res = get_fyers().history({"symbol": s, "resolution": "5", "date_format": "0", "range_from": BT_FLOOR_TS-900, "range_to": BT_FLOOR_TS-1, "cont_flag": "1"})
+        if res.get("s") == "ok":
+            for i, c in enumerate(res.get("candles", [])[-3:]):
+                volume_history.setdefault(s, []).append(c[5])
+                VOLUME_PROFILE.seed(s, c[5])
+                seeds.setdefault(s, []).append(c[5])
+                log("HISTORY", f"{s} | C{i+1} | V={c[5]}")
+
+    if RECORDER is not None: RECORDER.bias({"history": seeds}, int(time.time()))
+
+# ================= APP FACTORY =================
+def create_app(start=True):
+    from flask import Flask, jsonify, request
+
+    t0 = time.perf_counter()
+    app = Flask(__name__)
+
+    @app.route("/push-sector-bias", methods=["POST"])
+    def receive_bias():
+        status = apply_bias(request.get_json(force=True))
+        return jsonify({"status": "received", "bias": status})
+
+    @app.route("/")
+    def health(): return jsonify({"status": "ok"})
+
+    @app.route("/fyers-redirect")
+    def fyers_redirect():
+        log("SYSTEM", "FYERS redirect hit")
+        return jsonify({"status": "ok"})
+
+    @app.route("/metrics")
+    def metrics():
+        return jsonify({"startup": STARTUP_TIMINGS, "tick_queue": tick_queue.qsize(), "lanes": tick_queue.snapshot(), "fyers": GATEWAY.snapshot(), "gaps": GAPS.stats, "session": {"day": SESSION.day, **SESSION.sizes()},
+                        "bias": {"epoch": BIAS.epoch, "seq": BIAS.seq, "active": len(BIAS.active), "done": BIAS.done, **BIAS_BOOK.stats}})
+
+    @app.route("/positions")
+    def positions():
+        # Running totals: O(1) however many positions are open. ?detail=1 adds rows.
+        if PORTFOLIO is None: return jsonify({"totals": None})
+        out = {"totals": PORTFOLIO.totals(), "per_trade_risk": {s.name: s.per_trade_risk for s in STRATEGIES}}
+        if request.args.get("detail"): out["rows"] = PORTFOLIO.rows_view()
+        return jsonify(out)
+
+    _mark("app_ms", t0)
+    if start: start_engine()
+    return app
+
+_app = None
+
+def __getattr__(name):
+    # `gunicorn main:app` keeps working: the app is built on first access
+    global _app
+    if name == "app":
+        if _app is None: _app = create_app()
+        return _app
+    raise AttributeError(name)
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 10000)))
+    create_app().run(host="0.0.0.0", port=int(os.environ.get("PORT", 10000)))
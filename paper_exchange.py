@@ -0,0 +1,158 @@
+# ============================================================
+# paper_exchange.py
+# Deterministic Local Matching For PAPER Strategies
+# SAME ORDER CALLS AS FYERS, FILLS FROM THE TICK STREAM
+# ============================================================
+#
+# PAPER strategies send place_order / cancel_order here instead of
+# to Fyers, with the same payloads. Ticks drive matching:
+#
+#   stop-market (type 3)  triggers on the first ltp at/through the
+#                         stop and fills at *that* ltp (a jump of more
+#                         than one exchange tick past the stop counts
+#                         as a gap fill)
+#   market (type 2)       fills at the next eligible ltp
+#
+# With no slippage configured the fill is the ltp itself. Otherwise
+# the price moves against the order by the slipped amount only: bps
+# of the ltp in whole paise, plus whole exchange ticks (PAPER_TICK_PAISE,
+# NSE's 0.05 by default). No re-rounding onto round_price's bands.
+#
+# Latency is counted in ticks of the order's symbol: an order only
+# becomes eligible after `latency_ticks` (+ up to `latency_jitter`)
+# ticks have passed. All randomness comes from one seeded RNG, so the
+# same ticks + seed give the same fills. Prices are paise inside.
+# ============================================================
+
+import os
+import random
+import zlib
+
+from signal_candle_order import to_paise, from_paise
+
+
+# Fyers order status codes
+CANCELLED, FILLED, REJECTED, PENDING = 1, 2, 5, 6
+
+PAPER_SEED = int(os.getenv("PAPER_SEED", 0))
+PAPER_TICK_PAISE = int(os.getenv("PAPER_TICK_PAISE", 5))
+
+
+class PaperExchange:
+
+    def __init__(
+        self, *, seed=PAPER_SEED, name="",
+        latency_ticks=0, latency_jitter=0,
+        slippage_bps=0.0, slippage_ticks=0,
+    ):
+        # crc32, not hash(): str hashes change per process
+        self.seed = seed ^ zlib.crc32(name.encode())
+        self.latency_ticks = int(latency_ticks)
+        self.latency_jitter = int(latency_jitter)
+        self.slippage_bps = float(slippage_bps)
+        self.slippage_ticks = int(slippage_ticks)
+        self.reset()
+
+    def reset(self):
+        self.rng = random.Random(self.seed)
+        self.orders = {}     # id → order dict
+        self.resting = {}    # symbol → [open orders]
+        self.n = 0
+        self.stats = {"placed": 0, "filled": 0, "cancelled": 0, "rejected": 0, "gap_fills": 0, "slippage_paise": 0}
+
+    # ---------------- ORDER SURFACE (Fyers-shaped) ----------------
+    def place_order(self, data):
+        typ = data.get("type")
+        if typ not in (2, 3):
+            self.stats["rejected"] += 1
+            return {"s": "error", "code": -50, "message": f"paper: unsupported order type {typ}"}
+
+        self.n += 1
+        oid = f"PX{self.n:06d}"
+        wait = self.latency_ticks
+        if self.latency_jitter: wait += self.rng.randint(0, self.latency_jitter)
+        order = {
+            "id": oid,
+            "symbol": data["symbol"],
+            "side": data["side"],    # 1 buy, -1 sell
+            "qty": data["qty"],
+            "type": typ,
+            "stop": to_paise(data["stopPrice"]) if typ == 3 else None,
+            "status": PENDING,
+            "traded": None,
+            "wait": wait,
+        }
+        self.orders[oid] = order
+        self.resting.setdefault(order["symbol"], []).append(order)
+        self.stats["placed"] += 1
+        return {"s": "ok", "code": 1101, "id": oid}
+
+    def cancel_order(self, data):
+        order = self.orders.get(data.get("id"))
+        if order is None or order["status"] != PENDING:
+            return {"s": "error", "code": -52, "message": "paper: order not open"}
+        order["status"] = CANCELLED
+        self._unrest(order)
+        self.stats["cancelled"] += 1
+        return {"s": "ok", "code": 1103, "id": order["id"]}
+
+    def orderbook(self, data=None):
+        oid = (data or {}).get("id")
+        orders = [self.orders[oid]] if oid in self.orders else [] if oid else list(self.orders.values())
+        return {"s": "ok", "orderBook": [{
+            "id": o["id"], "symbol": o["symbol"], "side": o["side"], "qty": o["qty"], "type": o["type"],
+            "stopPrice": from_paise(o["stop"]) if o["stop"] is not None else 0,
+            "status": o["status"],
+            "filledQty": o["qty"] if o["status"] == FILLED else 0,
+            "tradedPrice": from_paise(o["traded"]) if o["traded"] is not None else 0,
+        } for o in orders]}
+
+    def fill_price(self, order_id):
+        """Traded price in paise, or None while not filled."""
+        order = self.orders.get(order_id)
+        return order["traded"] if order is not None else None
+
+    # ---------------- MATCHING ----------------
+    def on_tick(self, symbol, ltp):
+        orders = self.resting.get(symbol)
+        if not orders:
+            return
+
+        p = to_paise(ltp)
+        for order in list(orders):
+            if order["wait"] > 0:
+                order["wait"] -= 1
+                continue
+            stop = order["stop"]
+            if stop is not None:
+                if order["side"] == 1 and p < stop: continue
+                if order["side"] == -1 and p > stop: continue
+                if abs(p - stop) > PAPER_TICK_PAISE: self.stats["gap_fills"] += 1
+            self._fill(order, p)
+
+    def _fill(self, order, p):
+        slip = int(p * self.slippage_bps // 10000) if self.slippage_bps else 0
+        if self.slippage_ticks:
+            slip += self.rng.randint(0, self.slippage_ticks) * PAPER_TICK_PAISE
+        # always against the trader: buys pay up, sells give up
+        traded = p + slip * order["side"]
+        order["traded"] = traded
+        order["status"] = FILLED
+        self._unrest(order)
+        self.stats["filled"] += 1
+        self.stats["slippage_paise"] += (traded - p) * order["side"] * order["qty"]
+
+    def _unrest(self, order):
+        orders = self.resting.get(order["symbol"])
+        if orders is None:
+            return
+        orders.remove(order)
+        if not orders:
+            del self.resting[order["symbol"]]
+
+
+__all__ = [
+    "PaperExchange",
+    "PAPER_SEED",
+    "PAPER_TICK_PAISE",
+]
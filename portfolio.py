@@ -0,0 +1,201 @@
+# ============================================================
+# portfolio.py
+# Array-Backed Portfolio View Over Every Strategy Book
+# O(1) TOTALS, IN-PLACE ROW UPDATES ON TICKS
+# ============================================================
+#
+# One row per (strategy, symbol) position, filled at entry and closed
+# at SL_HIT (realized at the exit fill). Columns are parallel numpy
+# arrays in integer paise, like the order books they mirror.
+#
+# A tick rewrites its rows and moves the running totals by each row's
+# delta, so totals() costs the same with 1 or 1000 open positions.
+# recompute() derives the same totals from the arrays in one
+# vectorized pass (cross-check / audits).
+#
+# Written only by the tick worker (via StrategyRouter.on_ltp).
+# ============================================================
+
+import numpy as np
+
+from signal_candle_order import to_paise, from_paise
+
+
+INITIAL_ROWS = 256
+
+
+class Portfolio:
+
+    def __init__(self, capacity=INITIAL_ROWS):
+        self.capacity = 0
+        self._alloc(capacity)
+        self.reset()
+
+    def _alloc(self, capacity):
+        old, n = self.capacity, getattr(self, "n", 0)
+        cols = {}
+        for name, dtype in (
+            ("entry", np.int64), ("qty", np.int64), ("side", np.int64),
+            ("ltp", np.int64), ("sl", np.int64), ("limit", np.int64),
+            ("realized", np.int64), ("unrealized", np.int64), ("open", np.bool_),
+        ):
+            col = np.zeros(capacity, dtype=dtype)
+            if old: col[:n] = getattr(self, name)[:n]
+            cols[name] = col
+        for name, col in cols.items():
+            setattr(self, name, col)
+        self.capacity = capacity
+
+    def reset(self):
+        """New day: forget every row; keep the allocated arrays."""
+        self.n = 0
+        self.rows = {}       # (strategy, symbol) → row
+        self.keys = []       # row → (strategy, symbol)
+        self.states = []     # row → order state dict it mirrors
+
+        self.open_count = 0
+        self.realized_total = 0
+        self.unrealized_total = 0
+        self.gross_total = 0      # Σ qty * ltp over open rows
+        self.risk_total = 0       # Σ qty * distance to SL (loss side only)
+        self.limit_total = 0      # Σ per-trade risk over open rows
+        self.over_limit = 0       # open rows whose SL risk exceeds their limit
+
+    # ---------------- ROW HELPERS ----------------
+    def _risk(self, i):
+        r = int(self.side[i] * (self.entry[i] - self.sl[i]) * self.qty[i])
+        return r if r > 0 else 0
+
+    def _open(self, key, state, ltp, limit):
+        if self.n == self.capacity:
+            self._alloc(self.capacity * 2)
+        i = self.n
+        self.n += 1
+        self.rows[key] = i
+        self.keys.append(key)
+        self.states.append(state)
+
+        self.entry[i] = state["entry_price"]
+        self.qty[i] = state["qty"]
+        self.side[i] = 1 if state["side"] == "BUY" else -1
+        self.sl[i] = state["sl_price"]
+        self.limit[i] = limit
+        self.ltp[i] = ltp
+        self.realized[i] = 0
+        self.unrealized[i] = u = int(self.side[i] * (ltp - self.entry[i]) * self.qty[i])
+        self.open[i] = True
+
+        risk = self._risk(i)
+        self.open_count += 1
+        self.unrealized_total += u
+        self.gross_total += int(self.qty[i]) * ltp
+        self.risk_total += risk
+        self.limit_total += limit
+        if risk > limit: self.over_limit += 1
+        return i
+
+    def _set_sl(self, i, sl):
+        before = self._risk(i)
+        self.sl[i] = sl
+        after = self._risk(i)
+        self.risk_total += after - before
+        limit = int(self.limit[i])
+        self.over_limit += (after > limit) - (before > limit)
+
+    def _close(self, i, exit_p):
+        self.realized[i] = r = int(self.side[i] * (exit_p - self.entry[i]) * self.qty[i])
+        risk = self._risk(i)
+        self.open_count -= 1
+        self.realized_total += r
+        self.unrealized_total -= int(self.unrealized[i])
+        self.gross_total -= int(self.qty[i] * self.ltp[i])
+        self.risk_total -= risk
+        self.limit_total -= int(self.limit[i])
+        if risk > self.limit[i]: self.over_limit -= 1
+        self.unrealized[i] = 0
+        self.open[i] = False
+
+    # ---------------- TICK PATH ----------------
+    def sync(self, strategy, symbol, state, ltp, limit):
+        """
+        Mirror one order state after its LTP event. ltp in rupees,
+        limit (per-trade risk) in paise.
+        """
+        key = (strategy, symbol)
+        i = self.rows.get(key)
+        if i is None or self.states[i] is not state:
+            if state is None or state.get("entry_price") is None:
+                return
+            i = self._open(key, state, to_paise(ltp), limit)
+        elif not self.open[i]:
+            return
+        else:
+            ltp = to_paise(ltp)
+            u = int(self.side[i] * (ltp - self.entry[i]) * self.qty[i])
+            self.unrealized_total += u - int(self.unrealized[i])
+            self.gross_total += int(self.qty[i]) * (ltp - int(self.ltp[i]))
+            self.unrealized[i] = u
+            self.ltp[i] = ltp
+
+        if state["sl_price"] != self.sl[i]:
+            self._set_sl(i, state["sl_price"])
+        if state["status"] == "SL_HIT":
+            exit_p = state.get("exit_price")
+            self._close(i, self.sl[i] if exit_p is None else exit_p)
+
+    # ---------------- VIEWS ----------------
+    def totals(self):
+        """Running totals, rupees. O(1)."""
+        return {
+            "open": self.open_count,
+            "closed": self.n - self.open_count,
+            "gross_exposure": from_paise(self.gross_total),
+            "realized": from_paise(self.realized_total),
+            "unrealized": from_paise(self.unrealized_total),
+            "net_pnl": from_paise(self.realized_total + self.unrealized_total),
+            "open_risk": from_paise(self.risk_total),
+            "risk_limit": from_paise(self.limit_total),
+            "over_limit": self.over_limit,
+        }
+
+    def recompute(self):
+        """Same totals, derived from the arrays in one vectorized pass."""
+        n = self.n
+        live = self.open[:n]
+        qty, side = self.qty[:n], self.side[:n]
+        risk = np.maximum(side * (self.entry[:n] - self.sl[:n]) * qty, 0) * live
+        realized = int(self.realized[:n].sum())
+        unrealized = int(self.unrealized[:n][live].sum())
+        return {
+            "open": int(live.sum()),
+            "closed": int(n - live.sum()),
+            "gross_exposure": from_paise(int((qty * self.ltp[:n])[live].sum())),
+            "realized": from_paise(realized),
+            "unrealized": from_paise(unrealized),
+            "net_pnl": from_paise(realized + unrealized),
+            "open_risk": from_paise(int(risk.sum())),
+            "risk_limit": from_paise(int(self.limit[:n][live].sum())),
+            "over_limit": int((risk > self.limit[:n])[live].sum()),
+        }
+
+    def rows_view(self):
+        """Per-position detail, rupees. O(rows)."""
+        out = []
+        for i, (strategy, symbol) in enumerate(self.keys):
+            out.append({
+                "strategy": strategy,
+                "symbol": symbol,
+                "side": "BUY" if self.side[i] > 0 else "SELL",
+                "qty": int(self.qty[i]),
+                "entry": from_paise(int(self.entry[i])),
+                "ltp": from_paise(int(self.ltp[i])),
+                "sl": from_paise(int(self.sl[i])),
+                "open": bool(self.open[i]),
+                "pnl": from_paise(int(self.realized[i] + self.unrealized[i])),
+            })
+        return out
+
+
+__all__ = [
+    "Portfolio",
+]
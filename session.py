@@ -0,0 +1,89 @@
+# ============================================================
+# session.py
+# Per-Day Engine State + IST Calendar Rollover
+# NOTHING CARRIES OVER TO THE NEXT DAY EXCEPT THE ARCHIVE
+# ============================================================
+#
+# EngineSession owns every per-symbol container the engine fills
+# during one IST trading day (bias lives in bias_protocol snapshots).
+# main.py binds its module-level names (candles, last_base_vol, ...)
+# to these containers so the tick path is unchanged, and rebinds them
+# after a rollover.
+#
+# Rollover: archive the day as JSON, then start over from a fresh
+# session. release(): drop unsubscribed symbols. Keys are popped in
+# place, never by swapping in rebuilt dicts: bias ingest and history
+# seeding write through main's aliases from other threads, and a write
+# landing between a rebuild's copy and the rebind would be lost. The
+# dicts are bounded by the day's universe and start fresh at rollover.
+#
+# Pure state: the engine calls in from its single tick worker.
+# ============================================================
+
+import os
+import json
+import time
+
+
+IST_OFFSET = 19800
+
+# per-symbol containers, all keyed by symbol
+SYMBOL_MAPS = (
+    "candles",
+    "last_base_vol",
+    "last_ws_base_before_bias",
+    "volume_history",
+    "last_tick_ts",
+)
+
+
+def ist_day(ts=None):
+    """IST calendar date (YYYY-MM-DD) of a unix timestamp (default: now)."""
+    return time.strftime("%Y-%m-%d", time.gmtime((time.time() if ts is None else ts) + IST_OFFSET))
+
+
+class EngineSession:
+
+    def __init__(self, day):
+        self.day = day
+        self.opened = time.time()
+        for name in SYMBOL_MAPS:
+            setattr(self, name, {})
+
+    def release(self, symbols):
+        for name in SYMBOL_MAPS:
+            d = getattr(self, name)
+            for s in symbols:
+                d.pop(s, None)
+
+    def sizes(self):
+        return {name: len(getattr(self, name)) for name in SYMBOL_MAPS}
+
+    def archive(self, root, strategies, extra=None, tag=""):
+        """
+        Write <root>/<day><tag>.json atomically. Returns the path.
+        Cluster workers pass their tag (".w0", ...) so they never share
+        a file or its tmp.
+        """
+        os.makedirs(root, exist_ok=True)
+        data = {
+            "day": self.day,
+            "opened": int(self.opened),
+            "closed": int(time.time()),
+            "volume_history": {s: v for s, v in self.volume_history.items()},
+            "strategies": {st.name: st.snapshot() for st in strategies},
+            **(extra or {}),
+        }
+        path = os.path.join(root, f"{self.day}{tag}.json")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump(data, fh)
+        os.replace(tmp, path)
+        return path
+
+
+__all__ = [
+    "EngineSession",
+    "ist_day",
+    "SYMBOL_MAPS",
+]
@@ -3,13 +3,19 @@
 # RR 2.5 DYNAMIC → TRAILING SL (ENTRY ± 200)
 # ORIGINAL STRUCTURE PRESERVED + PROPER GUARD
 # LIVE + PAPER COMPATIBLE
+# ALL ORDER PRICES HELD AS INTEGER PAISE
 # ============================================================
-
-from math import floor
+#
+# `fyers` is the order endpoint: the Fyers gateway in LIVE mode, a
+# PaperExchange (paper_exchange.py) in PAPER mode. Orders go out the
+# same way in both; only fill detection differs (see entry_fill).
 
 # ------------------------------------------------------------
 # ORDER STATE
 # ------------------------------------------------------------
+# Prices inside ORDER_STATE (trigger, signal_high/low, entry_price,
+# sl_price) are integer paise. Rupee floats only exist at the feed
+# input (ltp, candle high/low) and at the broker / log boundary.
 ORDER_STATE = {}
 
 RR_MULTIPLIER = 2.5
@@ -17,23 +23,48 @@ LOCK_PROFIT = 200
 
 
 # ------------------------------------------------------------
-# HELPERS
+# PRICE (INTEGER PAISE)
 # ------------------------------------------------------------
+# (band floor, tick) in paise, highest band first
+TICK_TABLE = (
+    (50000, 100),   # >= 500.00 → 1.00
+    (10000, 10),    # >= 100.00 → 0.10
+    (0, 5),         # below     → 0.05
+)
+
+
+def to_paise(price):
+    return int(round(price * 100))
+
+
+def from_paise(p):
+    return p / 100
+
+
+def tick_paise(p):
+    for band, tick in TICK_TABLE:
+        if p >= band:
+            return tick
+    return TICK_TABLE[-1][1]
+
+
+def round_paise(p):
+    return p - p % tick_paise(p)
+
+
 def round_price(price):
-    if price >= 500:
-        unit = 1.0
-    elif price >= 100:
-        unit = 0.1
-    else:
-        unit = 0.05
-    return floor(price / unit) * unit
+    return from_paise(round_paise(to_paise(price)))
 
 
-def calc_qty(high, low, risk):
-    rng = abs(high - low)
+def calc_qty_paise(high_p, low_p, risk_p):
+    rng = abs(high_p - low_p)
     if rng <= 0:
         return 0
-    return floor(risk / rng)
+    return risk_p // rng
+
+
+def calc_qty(high, low, risk):
+    return calc_qty_paise(to_paise(high), to_paise(low), to_paise(risk))
 
 
 # ------------------------------------------------------------
@@ -41,54 +72,78 @@ def calc_qty(high, low, risk):
 # ------------------------------------------------------------
 def place_signal_order(
     *, fyers, symbol, side, high, low,
-    per_trade_risk, mode, signal_no, log_fn
+    per_trade_risk, mode, signal_no, log_fn,
+    order_state=None
 ):
 
-    qty = calc_qty(high, low, per_trade_risk)
+    book = ORDER_STATE if order_state is None else order_state
+
+    high_p = to_paise(high)
+    low_p = to_paise(low)
+
+    qty = calc_qty_paise(high_p, low_p, to_paise(per_trade_risk))
     if qty <= 0:
         log_fn(f"ORDER_SKIP | {symbol} | qty=0")
         return
 
-    trigger = high if side == "BUY" else low
+    trigger = high_p if side == "BUY" else low_p
     txn = 1 if side == "BUY" else -1
-    init_sl = low if side == "BUY" else high
+    init_sl = low_p if side == "BUY" else high_p
 
     log_fn(
         f"ORDER_SIGNAL | {symbol} | {side} | "
-        f"trigger={trigger} SL={round(init_sl,2)} qty={qty} | SIGNAL#{signal_no}"
+        f"trigger={from_paise(trigger)} SL={from_paise(init_sl)} qty={qty} | SIGNAL#{signal_no}"
     )
 
-    signal_order_id = None
-
-    if mode == "LIVE":
-        resp = fyers.place_order({
-            "symbol": symbol,
-            "qty": qty,
-            "type": 3,
-            "side": txn,
-            "productType": "INTRADAY",
-            "stopPrice": trigger,
-            "validity": "DAY",
-            "offlineOrder": False,
-        })
-        signal_order_id = resp.get("id")
-
-    ORDER_STATE[symbol] = {
+    resp = fyers.place_order({
+        "symbol": symbol,
+        "qty": qty,
+        "type": 3,
+        "side": txn,
+        "productType": "INTRADAY",
+        "stopPrice": from_paise(trigger),
+        "validity": "DAY",
+        "offlineOrder": False,
+    })
+    signal_order_id = resp.get("id")
+
+    book[symbol] = {
         "status": "PENDING",
         "side": side,
         "trigger": trigger,
         "qty": qty,
-        "signal_high": high,
-        "signal_low": low,
+        "signal_high": high_p,
+        "signal_low": low_p,
         "entry_price": None,
         "sl_price": None,
+        "exit_price": None,
         "sl_order_id": None,
         "signal_order_id": signal_order_id,
         "trail_done": False,
         "risk": per_trade_risk,   # 🔥 dynamic RR support
+        "rr_profit": None,        # paise, fixed at entry
     }
 
 
+# ------------------------------------------------------------
+# CANCEL ENTRY ORDER
+# ------------------------------------------------------------
+def cancel_signal(fyers, state, symbol, mode, log_fn):
+    prefix = "" if mode == "LIVE" else "PAPER_"
+    if state.get("signal_order_id"):
+        try:
+            resp = fyers.cancel_order({"id": state["signal_order_id"]})
+        except Exception as e:
+            log_fn(f"SIGNAL_CANCEL_FAIL | {symbol} | {e}")
+            return False
+        if mode != "LIVE" and resp.get("s") != "ok":
+            # paper exchange already filled it; the next LTP event picks up the fill
+            log_fn(f"SIGNAL_CANCEL_FAIL | {symbol} | {resp.get('message')}")
+            return False
+    log_fn(f"{prefix}ORDER_CANCEL | {symbol} | SIGNAL")
+    return True
+
+
 # ------------------------------------------------------------
 # HANDLE SIGNAL EVENT
 # ------------------------------------------------------------
@@ -99,23 +154,18 @@ def handle_signal_event(**kwargs):
     mode = kwargs["mode"]
     log_fn = kwargs["log_fn"]
     side = kwargs.get("side")
+    order_state = kwargs.get("order_state")
+    book = ORDER_STATE if order_state is None else order_state
 
-    state = ORDER_STATE.get(symbol)
+    state = book.get(symbol)
 
     # CANCEL-ONLY MODE
     if side is None:
         if state and state.get("status") == "PENDING":
-            if mode == "LIVE" and state.get("signal_order_id"):
-                try:
-                    fyers.cancel_order({"id": state["signal_order_id"]})
-                    log_fn(f"ORDER_CANCEL | {symbol} | SIGNAL")
-                except Exception as e:
-                    log_fn(f"SIGNAL_CANCEL_FAIL | {symbol} | {e}")
-                    return
-            else:
-                log_fn(f"PAPER_ORDER_CANCEL | {symbol} | SIGNAL")
-
-            ORDER_STATE.pop(symbol, None)
+            if not cancel_signal(fyers, state, symbol, mode, log_fn):
+                return
+
+            book.pop(symbol, None)
         return
 
     # Ignore if trade already active or closed
@@ -124,17 +174,10 @@ def handle_signal_event(**kwargs):
 
     # Cancel old pending before new signal
     if state and state.get("status") == "PENDING":
-        if mode == "LIVE" and state.get("signal_order_id"):
-            try:
-                fyers.cancel_order({"id": state["signal_order_id"]})
-                log_fn(f"ORDER_CANCEL | {symbol} | SIGNAL")
-            except Exception as e:
-                log_fn(f"SIGNAL_CANCEL_FAIL | {symbol} | {e}")
-                return
-        else:
-            log_fn(f"PAPER_ORDER_CANCEL | {symbol} | SIGNAL")
+        if not cancel_signal(fyers, state, symbol, mode, log_fn):
+            return
 
-        ORDER_STATE.pop(symbol, None)
+        book.pop(symbol, None)
 
     place_signal_order(**kwargs)
 
@@ -148,68 +191,92 @@ def place_sl(fyers, state, symbol, sl_price, mode):
     qty = state["qty"]
     sl_side = -1 if side == "BUY" else 1
 
-    if mode == "LIVE":
-        resp = fyers.place_order({
-            "symbol": symbol,
-            "qty": qty,
-            "type": 3,
-            "side": sl_side,
-            "productType": "INTRADAY",
-            "stopPrice": round_price(sl_price),
-            "validity": "DAY",
-            "offlineOrder": False,
-        })
-        state["sl_order_id"] = resp.get("id")
+    resp = fyers.place_order({
+        "symbol": symbol,
+        "qty": qty,
+        "type": 3,
+        "side": sl_side,
+        "productType": "INTRADAY",
+        "stopPrice": from_paise(round_paise(sl_price)),
+        "validity": "DAY",
+        "offlineOrder": False,
+    })
+    state["sl_order_id"] = resp.get("id")
 
     state["sl_price"] = sl_price
     state["status"] = "SL_PLACED"
 
 
 def cancel_sl(fyers, state, symbol, mode, log_fn):
-    if mode == "LIVE" and state.get("sl_order_id"):
+    if state.get("sl_order_id"):
         try:
-            fyers.cancel_order({"id": state["sl_order_id"]})
-            log_fn(f"ORDER_CANCEL | {symbol} | SL")
+            resp = fyers.cancel_order({"id": state["sl_order_id"]})
         except Exception as e:
             log_fn(f"SL_CANCEL_FAIL | {symbol} | {e}")
             return False
+        if mode != "LIVE" and resp.get("s") != "ok":
+            return False   # paper SL already filled on this tick
+        if mode == "LIVE":
+            log_fn(f"ORDER_CANCEL | {symbol} | SL")
     state["sl_order_id"] = None
     return True
 
 
+# ------------------------------------------------------------
+# FILL DETECTION
+# ------------------------------------------------------------
+# LIVE: the broker's stop is assumed filled at the crossing LTP (entry)
+# or at the stop price (SL). PAPER: the exchange has already matched
+# this tick; read its traded price.
+def entry_fill(fyers, state, ltp, mode):
+    if mode == "LIVE":
+        crossed = ltp >= state["trigger"] if state["side"] == "BUY" else ltp <= state["trigger"]
+        return ltp if crossed else None
+    return fyers.fill_price(state["signal_order_id"])
+
+
+def sl_fill(fyers, state, ltp, mode):
+    if mode == "LIVE":
+        hit = ltp <= state["sl_price"] if state["side"] == "BUY" else ltp >= state["sl_price"]
+        return state["sl_price"] if hit else None
+    return fyers.fill_price(state["sl_order_id"])
+
+
 # ------------------------------------------------------------
 # HANDLE LTP EVENT
 # ------------------------------------------------------------
-def handle_ltp_event(*, fyers, symbol, ltp, mode, log_fn):
+def handle_ltp_event(
+    *, fyers, symbol, ltp, mode, log_fn,
+    order_state=None, rr_multiplier=None, lock_profit=None
+):
 
-    state = ORDER_STATE.get(symbol)
+    book = ORDER_STATE if order_state is None else order_state
+    state = book.get(symbol)
     if not state:
         return
 
+    if rr_multiplier is None:
+        rr_multiplier = RR_MULTIPLIER
+    if lock_profit is None:
+        lock_profit = LOCK_PROFIT
+
+    ltp = to_paise(ltp)
     side = state["side"]
     qty = state["qty"]
 
     # ---------------- ENTRY EXEC ----------------
     if state["status"] == "PENDING":
 
-        if (side == "BUY" and ltp >= state["trigger"]) or \
-           (side == "SELL" and ltp <= state["trigger"]):
-
-            entry = ltp
-
-            if mode != "LIVE":
-                buf = state["trigger"] * 0.001
-                entry = round_price(
-                    state["trigger"] + buf if side == "BUY"
-                    else state["trigger"] - buf
-                )
+        entry = entry_fill(fyers, state, ltp, mode)
+        if entry is not None:
 
             state["entry_price"] = entry
+            state["rr_profit"] = to_paise(state["risk"] * rr_multiplier)
             state["status"] = "EXECUTED"
 
             log_fn(
                 f"ORDER_EXECUTED | {symbol} | "
-                f"ENTRY={round(entry,2)} | QTY={qty} | MODE={mode}"
+                f"ENTRY={from_paise(entry)} | QTY={qty} | MODE={mode}"
             )
 
             init_sl = (
@@ -228,40 +295,41 @@ def handle_ltp_event(*, fyers, symbol, ltp, mode, log_fn):
         else (entry - ltp) * qty
     )
 
-    rr_profit = state["risk"] * RR_MULTIPLIER
-
     # ---------------- RR TRAILING (GUARDED) ----------------
     if state["status"] == "SL_PLACED" and \
-       profit >= rr_profit and \
+       profit >= state["rr_profit"] and \
        not state["trail_done"]:
 
-        new_sl = (
-            entry + (LOCK_PROFIT / qty)
-            if side == "BUY"
-            else entry - (LOCK_PROFIT / qty)
-        )
+        lock = to_paise(lock_profit) // qty
+        new_sl = entry + lock if side == "BUY" else entry - lock
 
         if cancel_sl(fyers, state, symbol, mode, log_fn):
             place_sl(fyers, state, symbol, new_sl, mode)
             state["trail_done"] = True
 
             log_fn(
-                f"MODIFIED_SL | {symbol} | SL={round(new_sl,2)} | RR=2.5 | LOCK=200"
+                f"MODIFIED_SL | {symbol} | SL={from_paise(new_sl)} | "
+                f"RR={rr_multiplier} | LOCK={lock_profit}"
             )
 
     # ---------------- SL HIT ----------------
     if state["status"] == "SL_PLACED":
-        if (side == "BUY" and ltp <= state["sl_price"]) or \
-           (side == "SELL" and ltp >= state["sl_price"]):
+        exit_p = sl_fill(fyers, state, ltp, mode)
+        if exit_p is not None:
 
+            state["exit_price"] = exit_p
             state["status"] = "SL_HIT"
 
             log_fn(
-                f"SL_EXECUTED | {symbol} | SL={round(state['sl_price'],2)}"
+                f"SL_EXECUTED | {symbol} | SL={from_paise(state['sl_price'])} | "
+                f"FILL={from_paise(exit_p)}"
             )
 
 
 __all__ = [
+    "to_paise",
+    "from_paise",
+    "round_price",
     "handle_signal_event",
     "handle_ltp_event",
     "ORDER_STATE",
@@ -0,0 +1,247 @@
+# ============================================================
+# strategy_engine.py
+# Strategy Instances + Event Fan-Out
+# ONE CANDLE ENGINE → MANY PARAMETER VARIANTS
+# ============================================================
+
+import json
+import os
+
+from signal_candle_order import (
+    handle_signal_event,
+    handle_ltp_event,
+    to_paise,
+    from_paise,
+    RR_MULTIPLIER,
+    LOCK_PROFIT,
+)
+from paper_exchange import PaperExchange
+
+
+# Order states that still need LTP events (entry trigger / SL / trail)
+LIVE_STATUSES = ("PENDING", "EXECUTED", "SL_PLACED")
+
+# Volume tests computed by the engine at each candle close:
+#   lowest       strictly below every earlier candle today
+#   session_p10  below the session's running p10 (streaming sketch)
+#   tod_p10      below the p10 of the same time-of-day over the last N days
+VOLUME_RULES = ("lowest", "session_p10", "tod_p10")
+
+
+# ------------------------------------------------------------
+# STRATEGY INSTANCE
+# ------------------------------------------------------------
+class Strategy:
+    """
+    One parameter variant with its own order book.
+    Candle-close and LTP events come from the shared engine.
+    PAPER variants trade against their own seeded PaperExchange
+    (`paper` = its keyword options); LIVE ones use the engine's fyers.
+    """
+
+    def __init__(
+        self, name, *, log, mode="PAPER",
+        rr_multiplier=RR_MULTIPLIER, lock_profit=LOCK_PROFIT,
+        per_trade_risk=500.0, min_breadth=60.0, volume_rule="lowest",
+        paper=None
+    ):
+        if volume_rule not in VOLUME_RULES:
+            raise ValueError(f"{name}: unknown volume_rule {volume_rule!r}")
+
+        self.name = name
+        self.mode = mode
+        self.rr_multiplier = float(rr_multiplier)
+        self.lock_profit = float(lock_profit)
+        self.per_trade_risk = float(per_trade_risk)
+        self.risk_limit = to_paise(self.per_trade_risk)
+        self.min_breadth = float(min_breadth)
+        self.volume_rule = volume_rule
+
+        self.order_state = {}
+        self.signal_counter = {}
+        self.exchange = PaperExchange(name=name, **(paper or {})) if mode != "LIVE" else None
+
+        # Built once, not per event
+        if name == "default":
+            self.log_fn = lambda m: log("ORDER", m)
+        else:
+            self.log_fn = lambda m: log("ORDER", f"{name} | {m}")
+
+    def on_candle_close(self, fyers, symbol, c, *, volume_flags, color, bias, breadth):
+        if not volume_flags.get(self.volume_rule):
+            return
+        if self.exchange is not None:
+            fyers = self.exchange
+
+        state = self.order_state.get(symbol)
+        if state and state.get("status") == "PENDING":
+            handle_signal_event(
+                fyers=fyers, symbol=symbol, side=None, mode=self.mode,
+                log_fn=self.log_fn, order_state=self.order_state,
+            )
+
+        if breadth < self.min_breadth:
+            return
+
+        if (bias == "B" and color == "RED") or (bias == "S" and color == "GREEN"):
+            sc = self.signal_counter.get(symbol, 0) + 1
+            self.signal_counter[symbol] = sc
+            side = "BUY" if bias == "B" else "SELL"
+            handle_signal_event(
+                fyers=fyers, symbol=symbol, side=side,
+                high=c.high, low=c.low,
+                per_trade_risk=self.per_trade_risk, mode=self.mode,
+                signal_no=sc, log_fn=self.log_fn,
+                order_state=self.order_state,
+            )
+
+    def on_ltp(self, fyers, symbol, ltp):
+        if self.exchange is not None:
+            self.exchange.on_tick(symbol, ltp)   # match first, then the state machine reads fills
+            fyers = self.exchange
+        handle_ltp_event(
+            fyers=fyers, symbol=symbol, ltp=ltp, mode=self.mode,
+            log_fn=self.log_fn, order_state=self.order_state,
+            rr_multiplier=self.rr_multiplier, lock_profit=self.lock_profit,
+        )
+
+    def needs_ltp(self, symbol):
+        state = self.order_state.get(symbol)
+        return state is not None and state["status"] in LIVE_STATUSES
+
+    # ---------------- LIFECYCLE ----------------
+    def snapshot(self):
+        orders = {}
+        for sym, state in list(self.order_state.items()):
+            orders[sym] = {
+                "status": state["status"],
+                "side": state["side"],
+                "qty": state["qty"],
+                "trigger": _rupees(state.get("trigger")),
+                "entry_price": _rupees(state["entry_price"]),
+                "sl_price": _rupees(state["sl_price"]),
+                "exit_price": _rupees(state.get("exit_price")),
+            }
+        return {"orders": orders, "signals": dict(self.signal_counter)}
+
+    def live_symbols(self):
+        return [s for s in self.order_state if self.needs_ltp(s)]
+
+    def reset(self):
+        # New dicts rather than clear(): yesterday's grown tables are freed
+        self.order_state = {}
+        self.signal_counter = {}
+        if self.exchange is not None:
+            self.exchange.reset()
+
+    def release(self, symbols):
+        """Drop state for symbols with nothing live."""
+        drop = {s for s in symbols if not self.needs_ltp(s)}
+        self.order_state = {k: v for k, v in self.order_state.items() if k not in drop}
+        self.signal_counter = {k: v for k, v in self.signal_counter.items() if k not in drop}
+
+
+def _rupees(p):
+    return None if p is None else from_paise(p)
+
+
+# ------------------------------------------------------------
+# ROUTER
+# ------------------------------------------------------------
+class StrategyRouter:
+    """
+    Fans engine events out to strategies.
+    LTP events only reach strategies holding live order state
+    for that symbol, so idle strategies cost nothing per tick.
+    An attached Portfolio mirrors each routed state after its event.
+    """
+
+    def __init__(self, strategies, portfolio=None):
+        self.strategies = list(strategies)
+        self.ltp_routes = {}
+        self.portfolio = portfolio
+
+    def _refresh(self, symbol):
+        routes = tuple(s for s in self.strategies if s.needs_ltp(symbol))
+        if routes:
+            self.ltp_routes[symbol] = routes
+        else:
+            self.ltp_routes.pop(symbol, None)
+
+    def on_candle_close(self, fyers, symbol, c, *, volume_flags, color, bias, breadth):
+        if not any(volume_flags.values()):
+            return
+        for s in self.strategies:
+            s.on_candle_close(
+                fyers, symbol, c,
+                volume_flags=volume_flags, color=color, bias=bias, breadth=breadth,
+            )
+        self._refresh(symbol)
+
+    def on_ltp(self, fyers, symbol, ltp):
+        routes = self.ltp_routes.get(symbol)
+        if not routes:
+            return
+
+        pf = self.portfolio
+        changed = False
+        for s in routes:
+            before = s.order_state[symbol]["status"]
+            s.on_ltp(fyers, symbol, ltp)
+            state = s.order_state.get(symbol)
+            if pf is not None:
+                pf.sync(s.name, symbol, state, ltp, s.risk_limit)
+            if state is None or state["status"] != before:
+                changed = True
+
+        if changed:
+            self._refresh(symbol)
+
+    def reset(self):
+        for s in self.strategies:
+            s.reset()
+        self.ltp_routes = {}
+        if self.portfolio is not None:
+            self.portfolio.reset()
+
+    def release(self, symbols):
+        for s in self.strategies:
+            s.release(symbols)
+        for symbol in symbols:
+            self._refresh(symbol)
+
+
+# ------------------------------------------------------------
+# CONFIG
+# ------------------------------------------------------------
+def load_strategies(log, config=None):
+    """
+    Build strategies from a list of dicts, or the STRATEGY_CONFIG
+    env var (JSON list). Falls back to the single PAPER strategy.
+    """
+    if config is None:
+        raw = os.getenv("STRATEGY_CONFIG")
+        config = json.loads(raw) if raw else None
+
+    if not config:
+        config = [{
+            "name": "default",
+            "mode": "PAPER",
+            "per_trade_risk": float(os.getenv("PER_TRADE_RISK", 500)),
+        }]
+
+    strategies = []
+    for i, cfg in enumerate(config):
+        cfg = dict(cfg)
+        name = cfg.pop("name", f"S{i + 1}")
+        strategies.append(Strategy(name, log=log, **cfg))
+
+    return strategies
+
+
+__all__ = [
+    "Strategy",
+    "StrategyRouter",
+    "load_strategies",
+    "VOLUME_RULES",
+]
@@ -0,0 +1,239 @@
+# ============================================================
+# test_bias_protocol.py
+# BiasBook Ordering + LegacyAdapter vs The Previous Bias Maps
+# ANY ARRIVAL ORDER, ANY REPEATS → THE IN-ORDER SNAPSHOT
+# ============================================================
+#
+# old_maps() is a frozen copy of how apply_bias built ACTIVE_SYMBOLS /
+# STOCK_BIAS_MAP / STOCK_BREADTH_MAP from legacy batches before the
+# versioned protocol. Converted batches, shuffled and repeated, must
+# fold to the same active set and per-symbol (side, breadth).
+# ============================================================
+
+import random
+
+import pytest
+
+import bias_protocol
+from bias_protocol import BiasBook, LegacyAdapter, EMPTY_BIAS
+from sector_mapping import SECTOR_MAP
+from sector_engine import SECTOR_LIST
+
+
+def _payload(epoch, seq, added=None, changed=None, removed=(), final=False):
+    return {"epoch": epoch, "seq": seq, "added": added or {}, "changed": changed or {},
+            "removed": list(removed), "final": final}
+
+
+# ------------------------------------------------------------
+# ORDERING
+# ------------------------------------------------------------
+def test_in_order_apply():
+    book = BiasBook()
+    status, snap = book.ingest(_payload(100, 1, {"A": ["B", 70]}))
+    assert status == "applied"
+    assert snap.active == {"A"} and snap.bias["A"] == ("B", 70.0) and not snap.done
+
+    status, snap = book.ingest(_payload(100, 2, {"B": None}, {"A": ["S", 65]}, final=True))
+    assert status == "applied"
+    assert snap.active == {"A", "B"} and snap.done
+    assert snap.bias["A"] == ("S", 65.0) and "B" not in snap.bias
+
+
+def test_out_of_order_buffers_until_gap_fills():
+    book = BiasBook()
+    assert book.ingest(_payload(100, 3, {"C": ["B", 1]}, final=True))[0] == "buffered"
+    assert book.ingest(_payload(100, 2, {"B": ["B", 1]}))[0] == "buffered"
+    assert book.current is EMPTY_BIAS
+
+    status, snap = book.ingest(_payload(100, 1, {"A": ["B", 1]}))
+    assert status == "applied"
+    assert snap.seq == 3 and snap.active == {"A", "B", "C"} and snap.done
+    assert not book.pending
+
+
+def test_duplicate_seq():
+    book = BiasBook()
+    book.ingest(_payload(100, 1, {"A": ["B", 1]}))
+    before = book.current
+    assert book.ingest(_payload(100, 1, {"X": ["S", 1]})) == ("duplicate", before)
+
+    # a repeat of a buffered payload is a duplicate too
+    assert book.ingest(_payload(100, 3))[0] == "buffered"
+    assert book.ingest(_payload(100, 3))[0] == "duplicate"
+    assert book.stats["duplicate"] == 2
+
+
+def test_removed_and_stale_epoch():
+    book = BiasBook()
+    book.ingest(_payload(100, 1, {"A": ["B", 1], "B": ["S", 2]}))
+    _, snap = book.ingest(_payload(100, 2, removed=["A"]))
+    assert snap.active == {"B"} and "A" not in snap.bias
+    assert book.ingest(_payload(99, 1, {"Z": ["B", 1]})) == ("stale", snap)
+
+
+def test_universe_filter():
+    book = BiasBook()
+    _, snap = book.ingest(_payload(100, 1, {"A": ["B", 1], "X": ["B", 1]}), universe={"A"})
+    assert snap.active == {"A"}
+
+
+# ------------------------------------------------------------
+# NEWER EPOCH
+# ------------------------------------------------------------
+def test_newer_epoch_starts_from_empty():
+    book = BiasBook()
+    book.ingest(_payload(100, 1, {"A": ["B", 1]}, final=True))
+    book.ingest(_payload(100, 3, {"Z": ["B", 1]}))   # old epoch, never applied
+
+    status, snap = book.ingest(_payload(200, 1, {"B": ["S", 2]}))
+    assert status == "applied"
+    assert snap.epoch == 200 and snap.active == {"B"} and not snap.done
+    assert not book.pending   # the old epoch's buffer went with it
+
+
+def test_newer_epoch_waits_for_its_seq_1():
+    book = BiasBook()
+    _, old = book.ingest(_payload(100, 1, {"A": ["B", 1]}, final=True))
+    assert book.ingest(_payload(200, 2, {"C": ["B", 1]})) == ("buffered", old)
+    assert book.ingest(_payload(100, 2, {"D": ["B", 1]}))[0] == "applied"
+
+    _, snap = book.ingest(_payload(200, 1, {"B": ["B", 1]}))
+    assert snap.epoch == 200 and snap.seq == 2 and snap.active == {"B", "C"}
+
+
+# ------------------------------------------------------------
+# MAX_PENDING
+# ------------------------------------------------------------
+def test_full_buffer_evicts_furthest_ahead(monkeypatch):
+    monkeypatch.setattr(bias_protocol, "MAX_PENDING", 4)
+    book = BiasBook()
+    book.ingest(_payload(100, 1))
+    for seq in (3, 4, 6, 7):
+        assert book.ingest(_payload(100, seq))[0] == "buffered"
+
+    # further ahead than everything buffered: turned away
+    assert book.ingest(_payload(100, 9))[0] == "dropped"
+    assert set(book.pending) == {(100, 3), (100, 4), (100, 6), (100, 7)}
+
+    # nearer: buffered in place of the furthest one
+    assert book.ingest(_payload(100, 5))[0] == "buffered"
+    assert set(book.pending) == {(100, 3), (100, 4), (100, 5), (100, 6)}
+    assert book.stats["dropped"] == 2
+
+
+def test_full_buffer_never_drops_next_expected(monkeypatch):
+    monkeypatch.setattr(bias_protocol, "MAX_PENDING", 3)
+    book = BiasBook()
+    book.ingest(_payload(100, 1, {"A": ["B", 1]}))
+    for seq in (10, 11, 12):
+        book.ingest(_payload(100, seq))
+
+    status, snap = book.ingest(_payload(100, 2, {"B": ["B", 1]}))
+    assert status == "applied"
+    assert snap.seq == 2 and snap.active == {"A", "B"}
+    assert (100, 12) not in book.pending
+    assert book.stats["dropped"] == 1
+
+
+def test_full_buffer_never_drops_newer_epoch_seq_1(monkeypatch):
+    monkeypatch.setattr(bias_protocol, "MAX_PENDING", 2)
+    book = BiasBook()
+    book.ingest(_payload(100, 1))
+    book.ingest(_payload(300, 5))
+    book.ingest(_payload(300, 6))
+
+    status, snap = book.ingest(_payload(200, 1, {"N": ["S", 1]}, final=True))
+    assert status == "applied"
+    assert snap.epoch == 200 and snap.active == {"N"} and snap.done
+
+
+# ------------------------------------------------------------
+# LEGACY vs OLD MAPS
+# ------------------------------------------------------------
+def old_maps(batches):
+    """Frozen: ACTIVE_SYMBOLS, STOCK_BIAS_MAP, STOCK_BREADTH_MAP, BIAS_DONE."""
+    active, bias_map, breadth_map, done = set(), {}, {}, False
+    for data in batches:
+        if data.get("is_first_batch"):
+            active.clear()
+            bias_map.clear()
+            breadth_map.clear()
+        for s in data.get("strong_sectors", []):
+            key = SECTOR_LIST.get(s["sector"])
+            if key in SECTOR_MAP:
+                breadth = float(s.get("up_pct" if s["bias"] == "BUY" else "down_pct", 100.0))
+                for sym in SECTOR_MAP[key]:
+                    bias_map[sym] = "B" if s["bias"] == "BUY" else "S"
+                    breadth_map[sym] = breadth
+        for s in data.get("selected_stocks", []):
+            active.add(s)
+        if data.get("is_last_batch"):
+            done = True
+    return active, {s: (bias_map[s], breadth_map[s]) for s in active if s in bias_map}, done
+
+
+def _legacy_batches(rng, bias_ts):
+    sectors = list(SECTOR_LIST)
+    symbols = sorted({s for members in SECTOR_MAP.values() for s in members})
+    n = rng.randint(1, 6)
+    batches = []
+    for i in range(n):
+        strong = []
+        for name in rng.sample(sectors, rng.randint(0, 4)):
+            side = rng.choice(("BUY", "SELL"))
+            entry = {"sector": name, "bias": side}
+            if rng.random() < 0.8:
+                entry["up_pct" if side == "BUY" else "down_pct"] = rng.randint(50, 100)
+            strong.append(entry)
+        batches.append({
+            "is_first_batch": i == 0,
+            "is_last_batch": i == n - 1,
+            "bias_ts": bias_ts,
+            "strong_sectors": strong,
+            "selected_stocks": rng.sample(symbols, rng.randint(0, 30)),
+        })
+    return batches
+
+
+def test_legacy_matches_old_maps_any_order_and_repeats():
+    rng = random.Random(5)
+    for run in range(200):
+        batches = _legacy_batches(rng, 1718079300 + run)
+        active, bias, done = old_maps(batches)
+
+        # numbered once, in arrival order (the coordinator / HTTP handler)
+        adapter = LegacyAdapter()
+        payloads = [adapter.convert(b) for b in batches]
+
+        # delivered shuffled, with retries
+        delivery = payloads + [rng.choice(payloads) for _ in range(rng.randint(0, 4))]
+        rng.shuffle(delivery)
+        book = BiasBook()
+        for p in delivery:
+            book.ingest(p)
+
+        snap = book.current
+        assert snap.seq == len(batches)
+        assert snap.active == active
+        assert dict(snap.bias) == bias
+        assert snap.done == done
+
+
+def test_legacy_first_batch_resets():
+    adapter = LegacyAdapter()
+    name, key = next(iter(SECTOR_LIST.items()))
+    sym = SECTOR_MAP[key][0]
+    p1 = adapter.convert({"is_first_batch": True, "bias_ts": 100, "selected_stocks": [sym],
+                          "strong_sectors": [{"sector": name, "bias": "BUY", "up_pct": 80}]})
+    p2 = adapter.convert({"is_first_batch": True, "bias_ts": 200, "selected_stocks": [sym]})
+    assert (p1["epoch"], p1["seq"]) == (100, 1)
+    assert (p2["epoch"], p2["seq"]) == (200, 1)
+    assert p1["added"] == {sym: ["B", 80.0]}
+    assert p2["added"] == {sym: None}
+
+
+@pytest.mark.parametrize("final", [False, True])
+def test_legacy_last_batch_is_final(final):
+    p = LegacyAdapter().convert({"is_first_batch": True, "bias_ts": 1, "is_last_batch": final})
+    assert p["final"] is final
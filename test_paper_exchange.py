@@ -0,0 +1,362 @@
+# ============================================================
+# test_paper_exchange.py
+# PaperExchange Fills + Seeded Determinism + LIVE Path Unchanged
+# SAME TICKS + SEED → SAME FILLS; LIVE → SAME CALLS AS BEFORE
+# ============================================================
+#
+# The old_* functions are a frozen copy of the LIVE branches of the
+# order state machine before PAPER orders went through PaperExchange.
+# On random signal / tick paths, LIVE must send the same order calls,
+# reach the same states and write the same logs (SL_EXECUTED now also
+# carries the fill; compared without it).
+# ============================================================
+
+import random
+
+import pytest
+
+from paper_exchange import PaperExchange, PAPER_TICK_PAISE
+from strategy_engine import Strategy
+from tick_feed import Candle
+from signal_candle_order import (
+    to_paise,
+    from_paise,
+    round_paise,
+    calc_qty_paise,
+    handle_signal_event,
+    handle_ltp_event,
+)
+
+
+def _stop(x, side, price, qty=10, symbol="A"):
+    return x.place_order({"symbol": symbol, "side": side, "qty": qty, "type": 3, "stopPrice": price})["id"]
+
+
+# ------------------------------------------------------------
+# FILLS
+# ------------------------------------------------------------
+@pytest.mark.parametrize("side, stop, ltp", [
+    (1, 600.00, 600.05), (-1, 600.00, 599.95), (1, 606.00, 606.05), (1, 123.45, 123.46),
+])
+def test_no_slippage_fills_at_crossing_ltp(side, stop, ltp):
+    x = PaperExchange()
+    oid = _stop(x, side, stop)
+    x.on_tick("A", ltp)
+    assert x.fill_price(oid) == to_paise(ltp)
+    assert x.stats["slippage_paise"] == 0
+    assert x.stats["gap_fills"] == 0
+
+
+def test_stop_not_crossed_rests():
+    x = PaperExchange()
+    buy, sell = _stop(x, 1, 600.0), _stop(x, -1, 590.0)
+    x.on_tick("A", 599.95)
+    x.on_tick("A", 590.05)
+    assert x.fill_price(buy) is None and x.fill_price(sell) is None
+
+
+def test_gap_fill_needs_more_than_one_tick():
+    x = PaperExchange()
+    _stop(x, 1, 600.0)
+    x.on_tick("A", from_paise(60000 + PAPER_TICK_PAISE))
+    assert x.stats["gap_fills"] == 0
+
+    oid = _stop(x, -1, 600.0)
+    x.on_tick("A", 598.0)
+    assert x.fill_price(oid) == 59800
+    assert x.stats["gap_fills"] == 1
+
+
+def test_slippage_bps_is_adverse_in_paise():
+    x = PaperExchange(slippage_bps=2)
+    buy, sell = _stop(x, 1, 600.0), _stop(x, -1, 600.0)
+    x.on_tick("A", 600.0)
+    assert x.fill_price(buy) == 60012
+    assert x.fill_price(sell) == 59988
+    assert x.stats["slippage_paise"] == 2 * 12 * 10
+
+
+def test_slippage_ticks_are_whole_exchange_ticks():
+    x = PaperExchange(slippage_ticks=3, seed=11)
+    for _ in range(50):
+        oid = _stop(x, 1, 250.0)
+        x.on_tick("A", 250.0)
+        slip = x.fill_price(oid) - 25000
+        assert 0 <= slip <= 3 * PAPER_TICK_PAISE and slip % PAPER_TICK_PAISE == 0
+
+
+def test_latency_counts_symbol_ticks():
+    x = PaperExchange(latency_ticks=2)
+    oid = _stop(x, 1, 100.0)
+    x.on_tick("B", 101.0)
+    x.on_tick("A", 101.0)
+    x.on_tick("A", 102.0)
+    assert x.fill_price(oid) is None
+    x.on_tick("A", 103.0)
+    assert x.fill_price(oid) == 10300
+
+
+def test_cancel_after_fill_fails():
+    x = PaperExchange()
+    oid = _stop(x, 1, 100.0)
+    x.on_tick("A", 100.0)
+    assert x.cancel_order({"id": oid})["s"] == "error"
+
+
+# ------------------------------------------------------------
+# SEEDED DETERMINISM
+# ------------------------------------------------------------
+PAPER = {"seed": 7, "latency_ticks": 1, "latency_jitter": 3, "slippage_bps": 2.5, "slippage_ticks": 2}
+
+
+def _path(seed, n_candles=300):
+    """Candle closes on random symbols, each followed by ticks."""
+    rng = random.Random(seed)
+    symbols = [f"S{i}" for i in range(40)]
+    p = 50000
+    events = []
+    for i in range(n_candles):
+        ticks = []
+        for _ in range(rng.randint(3, 12)):
+            p = max(500, p + rng.randint(-60, 60))
+            ticks.append(from_paise(p))
+        c = Candle(i * 300, ticks[0], 0)
+        c.high, c.low, c.close = max(ticks), min(ticks), ticks[-1]
+        sym = rng.choice(symbols)
+        events.append(("C", sym, c, rng.choice("BS")))
+        events.extend(("T", rng.choice((sym, rng.choice(symbols))), t) for t in ticks)
+    return events
+
+
+def _run(events, paper=PAPER):
+    st = Strategy("det", log=lambda lvl, m: None, per_trade_risk=500,
+                  rr_multiplier=2.0, lock_profit=100, paper=paper)
+    return _feed(st, events)
+
+
+def _feed(st, events, broker=None):
+    for ev in events:
+        if ev[0] == "T":
+            if st.needs_ltp(ev[1]):
+                st.on_ltp(broker, ev[1], ev[2])
+            continue
+        _, symbol, c, bias = ev
+        color = "RED" if c.open > c.close else "GREEN" if c.open < c.close else "DOJI"
+        st.on_candle_close(broker, symbol, c, volume_flags={"lowest": True},
+                           color=color, bias=bias, breadth=80.0)
+    return st
+
+
+def _fills(st):
+    return st.exchange.orderbook()["orderBook"], dict(st.exchange.stats), st.snapshot()
+
+
+def test_same_seed_same_fills():
+    events = _path(1)
+    a, b = _run(events), _run(events)
+    assert a.exchange.stats["filled"] > 20
+    assert _fills(a) == _fills(b)
+
+
+def test_reset_replays_identically():
+    events = _path(2)
+    st = _run(events)
+    first = _fills(st)
+    st.reset()
+    assert _fills(_feed(st, events)) == first
+
+
+def test_other_seed_other_fills():
+    events = _path(1)
+    a, b = _run(events), _run(events, paper={**PAPER, "seed": 8})
+    assert _fills(a) != _fills(b)
+
+
+# ------------------------------------------------------------
+# LIVE: FROZEN PRE-EXCHANGE STATE MACHINE
+# ------------------------------------------------------------
+def old_place_signal_order(*, fyers, symbol, side, high, low, per_trade_risk, signal_no, log_fn, book):
+    high_p, low_p = to_paise(high), to_paise(low)
+    qty = calc_qty_paise(high_p, low_p, to_paise(per_trade_risk))
+    if qty <= 0:
+        log_fn(f"ORDER_SKIP | {symbol} | qty=0")
+        return
+    trigger = high_p if side == "BUY" else low_p
+    init_sl = low_p if side == "BUY" else high_p
+    log_fn(f"ORDER_SIGNAL | {symbol} | {side} | "
+           f"trigger={from_paise(trigger)} SL={from_paise(init_sl)} qty={qty} | SIGNAL#{signal_no}")
+    resp = fyers.place_order({
+        "symbol": symbol, "qty": qty, "type": 3, "side": 1 if side == "BUY" else -1,
+        "productType": "INTRADAY", "stopPrice": from_paise(trigger), "validity": "DAY", "offlineOrder": False,
+    })
+    book[symbol] = {
+        "status": "PENDING", "side": side, "trigger": trigger, "qty": qty,
+        "signal_high": high_p, "signal_low": low_p, "entry_price": None, "sl_price": None,
+        "sl_order_id": None, "signal_order_id": resp.get("id"), "trail_done": False,
+        "risk": per_trade_risk, "rr_profit": None,
+    }
+
+
+def old_handle_signal_event(*, fyers, symbol, side, log_fn, book, **kw):
+    state = book.get(symbol)
+    if side is None:
+        if state and state.get("status") == "PENDING":
+            if state.get("signal_order_id"):
+                try:
+                    fyers.cancel_order({"id": state["signal_order_id"]})
+                    log_fn(f"ORDER_CANCEL | {symbol} | SIGNAL")
+                except Exception as e:
+                    log_fn(f"SIGNAL_CANCEL_FAIL | {symbol} | {e}")
+                    return
+            book.pop(symbol, None)
+        return
+    if state and state.get("status") in ("EXECUTED", "SL_PLACED", "SL_HIT"):
+        return
+    if state and state.get("status") == "PENDING":
+        if state.get("signal_order_id"):
+            try:
+                fyers.cancel_order({"id": state["signal_order_id"]})
+                log_fn(f"ORDER_CANCEL | {symbol} | SIGNAL")
+            except Exception as e:
+                log_fn(f"SIGNAL_CANCEL_FAIL | {symbol} | {e}")
+                return
+        book.pop(symbol, None)
+    old_place_signal_order(fyers=fyers, symbol=symbol, side=side, log_fn=log_fn, book=book, **kw)
+
+
+def old_place_sl(fyers, state, symbol, sl_price):
+    resp = fyers.place_order({
+        "symbol": symbol, "qty": state["qty"], "type": 3, "side": -1 if state["side"] == "BUY" else 1,
+        "productType": "INTRADAY", "stopPrice": from_paise(round_paise(sl_price)), "validity": "DAY",
+        "offlineOrder": False,
+    })
+    state["sl_order_id"] = resp.get("id")
+    state["sl_price"] = sl_price
+    state["status"] = "SL_PLACED"
+
+
+def old_cancel_sl(fyers, state, symbol, log_fn):
+    if state.get("sl_order_id"):
+        try:
+            fyers.cancel_order({"id": state["sl_order_id"]})
+            log_fn(f"ORDER_CANCEL | {symbol} | SL")
+        except Exception as e:
+            log_fn(f"SL_CANCEL_FAIL | {symbol} | {e}")
+            return False
+    state["sl_order_id"] = None
+    return True
+
+
+def old_handle_ltp_event(*, fyers, symbol, ltp, log_fn, book, rr_multiplier, lock_profit):
+    state = book.get(symbol)
+    if not state:
+        return
+    ltp = to_paise(ltp)
+    side, qty = state["side"], state["qty"]
+
+    if state["status"] == "PENDING":
+        if (side == "BUY" and ltp >= state["trigger"]) or (side == "SELL" and ltp <= state["trigger"]):
+            state["entry_price"] = ltp
+            state["rr_profit"] = to_paise(state["risk"] * rr_multiplier)
+            state["status"] = "EXECUTED"
+            log_fn(f"ORDER_EXECUTED | {symbol} | ENTRY={from_paise(ltp)} | QTY={qty} | MODE=LIVE")
+            old_place_sl(fyers, state, symbol, state["signal_low"] if side == "BUY" else state["signal_high"])
+        return
+
+    entry = state["entry_price"]
+    profit = (ltp - entry) * qty if side == "BUY" else (entry - ltp) * qty
+    if state["status"] == "SL_PLACED" and profit >= state["rr_profit"] and not state["trail_done"]:
+        lock = to_paise(lock_profit) // qty
+        new_sl = entry + lock if side == "BUY" else entry - lock
+        if old_cancel_sl(fyers, state, symbol, log_fn):
+            old_place_sl(fyers, state, symbol, new_sl)
+            state["trail_done"] = True
+            log_fn(f"MODIFIED_SL | {symbol} | SL={from_paise(new_sl)} | RR={rr_multiplier} | LOCK={lock_profit}")
+
+    if state["status"] == "SL_PLACED":
+        if (side == "BUY" and ltp <= state["sl_price"]) or (side == "SELL" and ltp >= state["sl_price"]):
+            state["status"] = "SL_HIT"
+            log_fn(f"SL_EXECUTED | {symbol} | SL={from_paise(state['sl_price'])}")
+
+
+class _Broker:
+    """LIVE order endpoint: records calls; every `fail_every`th cancel raises."""
+
+    def __init__(self, fail_every=0):
+        self.calls = []
+        self.fail_every = fail_every
+        self.cancels = 0
+
+    def place_order(self, data):
+        self.calls.append(("place", data))
+        return {"s": "ok", "id": f"T{len(self.calls)}"}
+
+    def cancel_order(self, data):
+        self.calls.append(("cancel", data))
+        self.cancels += 1
+        if self.fail_every and self.cancels % self.fail_every == 0:
+            raise ConnectionError("broker timeout")
+        return {"s": "ok", "id": data["id"]}
+
+
+def _live_events(rng, n=120):
+    p = rng.randint(5000, 300000)
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.15:
+            high = p + rng.randint(5, 400)
+            low = high - rng.randint(5, 600)
+            yield "signal", rng.choice(("A", "B")), rng.choice(("BUY", "SELL")), from_paise(high), from_paise(low)
+        elif r < 0.2:
+            yield "cancel", rng.choice(("A", "B"))
+        else:
+            p = max(100, p + rng.randint(-300, 300))
+            yield "ltp", rng.choice(("A", "B")), from_paise(p)
+
+
+@pytest.mark.parametrize("fail_every", [0, 3])
+def test_live_path_matches_pre_exchange(fail_every):
+    rng = random.Random(9 + fail_every)
+    for _ in range(300):
+        events = list(_live_events(rng))
+        risk, rr, lock = rng.choice((250, 500, 1000)), rng.choice((1.5, 2.0, 2.5)), rng.choice((50, 100, 200))
+
+        new_broker, new_book, new_log = _Broker(fail_every), {}, []
+        old_broker, old_book, old_log = _Broker(fail_every), {}, []
+        n = 0
+        for ev in events:
+            if ev[0] == "signal":
+                n += 1
+                _, sym, side, high, low = ev
+                kw = dict(symbol=sym, side=side, high=high, low=low, per_trade_risk=risk, signal_no=n)
+                handle_signal_event(fyers=new_broker, mode="LIVE", log_fn=new_log.append, order_state=new_book, **kw)
+                old_handle_signal_event(fyers=old_broker, log_fn=old_log.append, book=old_book, **kw)
+            elif ev[0] == "cancel":
+                handle_signal_event(fyers=new_broker, symbol=ev[1], side=None, mode="LIVE",
+                                    log_fn=new_log.append, order_state=new_book)
+                old_handle_signal_event(fyers=old_broker, symbol=ev[1], side=None, log_fn=old_log.append, book=old_book)
+            else:
+                _, sym, ltp = ev
+                handle_ltp_event(fyers=new_broker, symbol=sym, ltp=ltp, mode="LIVE", log_fn=new_log.append,
+                                 order_state=new_book, rr_multiplier=rr, lock_profit=lock)
+                old_handle_ltp_event(fyers=old_broker, symbol=sym, ltp=ltp, log_fn=old_log.append,
+                                     book=old_book, rr_multiplier=rr, lock_profit=lock)
+
+        assert new_broker.calls == old_broker.calls
+        assert [m.split(" | FILL=")[0] for m in new_log] == old_log
+        for sym, state in new_book.items():
+            exit_p = state.pop("exit_price")
+            assert exit_p == (state["sl_price"] if state["status"] == "SL_HIT" else None)
+        assert new_book == old_book
+
+
+def test_live_strategy_uses_engine_broker():
+    st = Strategy("live", log=lambda lvl, m: None, mode="LIVE", per_trade_risk=500)
+    assert st.exchange is None
+    broker = _Broker()
+    c = Candle(0, 101.0, 0)
+    c.high, c.low, c.close = 101.0, 100.0, 100.5
+    st.on_candle_close(broker, "A", c, volume_flags={"lowest": True}, color="RED", bias="B", breadth=80.0)
+    st.on_ltp(broker, "A", 101.0)
+    assert [k for k, _ in broker.calls] == ["place", "place"]
+    assert st.order_state["A"]["entry_price"] == 10100
@@ -0,0 +1,232 @@
+# ============================================================
+# test_signal_candle_order.py
+# Integer-Paise Order Math vs The Previous Float Implementation
+# EQUIVALENT EXCEPT WHERE FLOAT DRIFTED (PINNED BELOW)
+# ============================================================
+#
+# The float_* functions are a frozen copy of the order math before
+# prices moved to integer paise. Where the two disagree, exact
+# rational arithmetic (Fraction) decides, and the paise side must
+# be the one that agrees with it.
+# ============================================================
+
+import random
+from fractions import Fraction
+from math import floor
+
+import pytest
+
+from signal_candle_order import (
+    to_paise,
+    from_paise,
+    round_price,
+    calc_qty,
+    handle_signal_event,
+    handle_ltp_event,
+)
+
+
+# ------------------------------------------------------------
+# FROZEN FLOAT IMPLEMENTATION
+# ------------------------------------------------------------
+def float_round_price(price):
+    if price >= 500:
+        unit = 1.0
+    elif price >= 100:
+        unit = 0.1
+    else:
+        unit = 0.05
+    return floor(price / unit) * unit
+
+
+def float_calc_qty(high, low, risk):
+    rng = abs(high - low)
+    if rng <= 0:
+        return 0
+    return floor(risk / rng)
+
+
+def float_trail_sl(side, entry, qty, lock_profit):
+    return entry + (lock_profit / qty) if side == "BUY" else entry - (lock_profit / qty)
+
+
+# ------------------------------------------------------------
+# EXACT REFERENCE
+# ------------------------------------------------------------
+def exact_round_paise(p):
+    unit = 100 if p >= 50000 else 10 if p >= 10000 else 5
+    return p // unit * unit
+
+
+def exact_qty(high_p, low_p, risk):
+    rng = abs(high_p - low_p)
+    return 0 if rng == 0 else floor(Fraction(risk) * 100 / rng)
+
+
+def _prices(n, seed, lo=1, hi=500000):
+    rng = random.Random(seed)
+    return [rng.randint(lo, hi) for _ in range(n)]
+
+
+# ------------------------------------------------------------
+# round_price
+# ------------------------------------------------------------
+def test_round_price_matches_float_or_exact():
+    drift = 0
+    for p in _prices(50000, 1):
+        price = from_paise(p)
+        new = round_price(price)
+        assert to_paise(new) == exact_round_paise(p)
+        old = float_round_price(price)
+        if abs(old - new) > 1e-9:
+            # float landed one tick low: price / unit came out just under an integer
+            assert to_paise(old) < exact_round_paise(p)
+            drift += 1
+    assert drift < 50000 // 10
+
+
+@pytest.mark.parametrize("price, expected", [
+    (499.99, 499.9), (500.0, 500.0), (1393.5, 1393.0),
+    (99.97, 99.95), (100.0, 100.0), (123.45, 123.4), (0.07, 0.05),
+])
+def test_round_price_bands(price, expected):
+    assert round_price(price) == expected
+    assert abs(float_round_price(price) - expected) < 1e-9
+
+
+def test_round_price_sub_paisa_input():
+    # Intended: the input is taken to the nearest paisa first.
+    # Float floored 99.999 straight to the 0.05 grid.
+    assert round_price(99.999) == 100.0
+    assert abs(float_round_price(99.999) - 99.95) < 1e-9
+
+
+# ------------------------------------------------------------
+# calc_qty
+# ------------------------------------------------------------
+def test_calc_qty_matches_float_or_exact():
+    rng = random.Random(2)
+    for _ in range(50000):
+        high_p = rng.randint(100, 500000)
+        low_p = high_p - rng.randint(0, 2000)
+        risk = rng.choice((250, 500, 750, 1000, 1234.5))
+        high, low = from_paise(high_p), from_paise(low_p)
+
+        new = calc_qty(high, low, risk)
+        assert new == exact_qty(high_p, low_p, risk)
+        old = float_calc_qty(high, low, risk)
+        if old != new:
+            assert old == new - 1   # float range came out a hair wide
+
+
+def test_calc_qty_float_drift_case():
+    # 1393.5 - 1393.3 = 0.2000000000000455 in float → 2499
+    assert float_calc_qty(1393.5, 1393.3, 500) == 2499
+    assert calc_qty(1393.5, 1393.3, 500) == 2500
+
+
+def test_calc_qty_zero_range():
+    assert calc_qty(100.0, 100.0, 500) == 0
+    assert float_calc_qty(100.0, 100.0, 500) == 0
+
+
+# ------------------------------------------------------------
+# TRIGGER / SL DERIVATION
+# ------------------------------------------------------------
+class _Broker:
+    """Minimal LIVE order endpoint: records payloads."""
+
+    def __init__(self):
+        self.orders = []
+
+    def place_order(self, data):
+        self.orders.append(data)
+        return {"s": "ok", "id": f"T{len(self.orders)}"}
+
+    def cancel_order(self, data):
+        return {"s": "ok", "id": data["id"]}
+
+
+def _signal(side, high, low, risk=500):
+    broker, book = _Broker(), {}
+    handle_signal_event(
+        fyers=broker, symbol="NSE:X-EQ", side=side, high=high, low=low,
+        per_trade_risk=risk, mode="LIVE", signal_no=1,
+        log_fn=lambda m: None, order_state=book,
+    )
+    return broker, book
+
+
+@pytest.mark.parametrize("side", ["BUY", "SELL"])
+def test_trigger_and_initial_sl(side):
+    rng = random.Random(3)
+    for _ in range(2000):
+        high_p = rng.randint(1000, 300000)
+        low_p = high_p - rng.randint(5, 500)
+        high, low = from_paise(high_p), from_paise(low_p)
+        broker, book = _signal(side, high, low)
+        state = book["NSE:X-EQ"]
+
+        trigger = high if side == "BUY" else low
+        init_sl = low if side == "BUY" else high
+        assert state["trigger"] == to_paise(trigger)
+        assert broker.orders[0]["stopPrice"] == trigger
+        assert broker.orders[0]["qty"] == calc_qty(high, low, 500)
+
+        # cross the trigger: entry at the crossing ltp, SL at the signal extreme
+        handle_ltp_event(fyers=broker, symbol="NSE:X-EQ", ltp=trigger, mode="LIVE",
+                         log_fn=lambda m: None, order_state=book)
+        assert state["status"] == "SL_PLACED"
+        assert state["entry_price"] == to_paise(trigger)
+        assert state["sl_price"] == to_paise(init_sl)
+        assert broker.orders[1]["stopPrice"] == round_price(init_sl)
+
+
+# ------------------------------------------------------------
+# TRAIL OFFSET
+# ------------------------------------------------------------
+def _trail(side, high, low, lock):
+    broker, book = _signal(side, high, low)
+    state = book["NSE:X-EQ"]
+    entry = high if side == "BUY" else low
+    kw = dict(fyers=broker, symbol="NSE:X-EQ", mode="LIVE", log_fn=lambda m: None,
+              order_state=book, rr_multiplier=2.5, lock_profit=lock)
+    handle_ltp_event(ltp=entry, **kw)
+
+    # far enough to clear 2.5R without touching the SL
+    move = 3 * (high - low)
+    handle_ltp_event(ltp=entry + move if side == "BUY" else entry - move, **kw)
+    assert state["trail_done"]
+    return state
+
+
+@pytest.mark.parametrize("side", ["BUY", "SELL"])
+def test_trail_offset_matches_float(side):
+    rng = random.Random(4)
+    for _ in range(2000):
+        high_p = rng.randint(10000, 300000)
+        low_p = high_p - rng.randint(50, 500)
+        lock = rng.choice((100, 200, 300))
+        high, low = from_paise(high_p), from_paise(low_p)
+        state = _trail(side, high, low, lock)
+
+        entry = high if side == "BUY" else low
+        old = float_trail_sl(side, entry, state["qty"], lock)
+        # paise floors the per-share lock to a whole paisa
+        lock_p = to_paise(lock) // state["qty"]
+        assert state["sl_price"] == state["entry_price"] + (lock_p if side == "BUY" else -lock_p)
+        assert abs(from_paise(state["sl_price"]) - old) < 0.01
+
+
+def test_trail_offset_floors_to_paisa():
+    # Intended: 200 / 3 = 66.666.. per share locks 66.66, not a sub-paisa SL
+    broker, book = _signal("BUY", 103.0, 100.0, risk=10)
+    state = book["NSE:X-EQ"]
+    assert state["qty"] == 3
+    kw = dict(fyers=broker, symbol="NSE:X-EQ", mode="LIVE", log_fn=lambda m: None,
+              order_state=book, rr_multiplier=2.5, lock_profit=200)
+    handle_ltp_event(ltp=103.0, **kw)
+    handle_ltp_event(ltp=112.0, **kw)
+    assert state["sl_price"] == to_paise(103.0) + 6666
+    assert float_trail_sl("BUY", 103.0, 3, 200) == pytest.approx(169.6666, abs=1e-3)
+
@@ -0,0 +1,153 @@
+# ============================================================
+# tick_feed.py
+# Tick Normalizer + Candle Record + Two-Lane Tick Queue
+# ONE CONVERSION AT INGESTION, NO DICTS DOWNSTREAM
+# ============================================================
+
+import threading
+from collections import deque
+from time import perf_counter
+
+
+# ------------------------------------------------------------
+# SYMBOL IDS
+# ------------------------------------------------------------
+# Canonical (interned) symbol string per known symbol. Every tick
+# reuses the same key object, so downstream dict lookups hit the
+# cached hash and identity compare.
+SYMBOL_IDS = {}
+
+
+def register_symbols(symbols):
+    for s in symbols:
+        SYMBOL_IDS.setdefault(s, s)
+
+
+# ------------------------------------------------------------
+# NORMALIZE
+# ------------------------------------------------------------
+def normalize_tick(msg, accept):
+    """
+    SDK message dict → (symbol, ltp, vol_traded_today, exch_feed_time, t_in).
+    t_in is the local perf_counter at ingestion (lane latency metrics).
+    Returns None for incomplete ticks or symbols outside `accept`.
+    """
+    try:
+        symbol = SYMBOL_IDS[msg["symbol"]]
+        ltp = msg["ltp"]
+        base_vol = msg["vol_traded_today"]
+        ts = msg["exch_feed_time"]
+    except (KeyError, TypeError):
+        return None
+
+    if not (ltp and base_vol and ts) or symbol not in accept:
+        return None
+
+    return (symbol, ltp, base_vol, ts, perf_counter())
+
+
+# ------------------------------------------------------------
+# CANDLE
+# ------------------------------------------------------------
+class Candle:
+    __slots__ = ("start", "open", "high", "low", "close", "base_vol")
+
+    def __init__(self, start, ltp, base_vol):
+        self.start = start
+        self.open = ltp
+        self.high = ltp
+        self.low = ltp
+        self.close = ltp
+        self.base_vol = base_vol
+
+
+# ------------------------------------------------------------
+# TWO-LANE TICK QUEUE
+# ------------------------------------------------------------
+# control: engine events (backfill results, reconnect, stale scan)
+# fast:    ticks for symbols with live order state (entry / SL / trail)
+# normal:  candle-only ticks; bounded, may be coalesced by the consumer
+#
+# One consumer thread drains control → fast → normal.
+
+FAST, NORMAL = 0, 1
+LATENCY_BOUNDS_MS = (1, 5, 20, 100, 500)
+
+
+class TickLanes:
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.control = deque()
+        self.fast = deque()
+        self.normal = deque()
+        self.ready = threading.Event()
+        self.dropped = 0
+
+        # per lane: [count, sum_ms, max_ms, histogram...]
+        self.stats = (
+            [0, 0.0, 0.0] + [0] * (len(LATENCY_BOUNDS_MS) + 1),
+            [0, 0.0, 0.0] + [0] * (len(LATENCY_BOUNDS_MS) + 1),
+        )
+
+    # ---------------- PRODUCERS ----------------
+    def put(self, event):
+        self.control.append(event)
+        self.ready.set()
+
+    def put_fast(self, tick):
+        self.fast.append(tick)
+        self.ready.set()
+
+    def put_normal(self, tick):
+        if len(self.normal) >= self.maxsize:
+            self.dropped += 1
+            return
+        self.normal.append(tick)
+        self.ready.set()
+
+    # ---------------- CONSUMER ----------------
+    def wait(self):
+        self.ready.clear()
+        if not (self.control or self.fast or self.normal):
+            self.ready.wait()
+
+    def record(self, lane, t_in):
+        ms = (perf_counter() - t_in) * 1000
+        st = self.stats[lane]
+        st[0] += 1
+        st[1] += ms
+        if ms > st[2]: st[2] = ms
+        i = 3
+        for bound in LATENCY_BOUNDS_MS:
+            if ms < bound: break
+            i += 1
+        st[i] += 1
+
+    def qsize(self):
+        return len(self.control) + len(self.fast) + len(self.normal)
+
+    def snapshot(self):
+        out = {"dropped": self.dropped}
+        for lane, name, depth in ((FAST, "fast", len(self.fast)), (NORMAL, "normal", len(self.normal))):
+            st = self.stats[lane]
+            labels = [f"<{b}ms" for b in LATENCY_BOUNDS_MS] + [f">={LATENCY_BOUNDS_MS[-1]}ms"]
+            out[name] = {
+                "depth": depth,
+                "ticks": st[0],
+                "avg_ms": round(st[1] / st[0], 3) if st[0] else 0.0,
+                "max_ms": round(st[2], 3),
+                "hist": dict(zip(labels, st[3:])),
+            }
+        return out
+
+
+__all__ = [
+    "SYMBOL_IDS",
+    "register_symbols",
+    "normalize_tick",
+    "Candle",
+    "TickLanes",
+    "FAST",
+    "NORMAL",
+]
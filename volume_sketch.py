@@ -0,0 +1,240 @@
+# ============================================================
+# volume_sketch.py
+# Bounded-Memory Volume Quantiles Per Symbol
+# SESSION P10 (P² SKETCH) + TIME-OF-DAY P10 OVER LAST N DAYS
+# ============================================================
+#
+# Session:     one P² estimator per symbol (Jain & Chlamtac, 1985):
+#              exact over the first EXACT_N values, then five markers
+#              seeded from them; O(1) update and query however long
+#              the session runs.
+# Time-of-day: per (symbol, slot) a ring of the last N daily values.
+#              The query sorts at most N numbers, independent of how
+#              many days have been seen.
+# ============================================================
+
+import os
+import json
+import time
+import threading
+from collections import deque
+
+
+VOLUME_QUANTILE = 0.10
+EXACT_N = 64
+TOD_DAYS = int(os.getenv("TOD_DAYS", 20))
+TOD_MIN_DAYS = 5
+IST_OFFSET = 19800
+
+
+# ------------------------------------------------------------
+# P² QUANTILE
+# ------------------------------------------------------------
+class P2Quantile:
+    __slots__ = ("p", "n", "q", "pos", "des", "inc")
+
+    def __init__(self, p):
+        self.p = p
+        self.n = 0
+        self.q = []
+        self.pos = None
+        self.des = None
+        self.inc = (0, p / 2, p, (1 + p) / 2, 1)
+
+    def _to_markers(self):
+        s = sorted(self.q)
+        n = len(s)
+        self.des = [1 + (n - 1) * f for f in self.inc]
+        self.pos = [int(round(d)) for d in self.des]
+        for i in (1, 2, 3):   # keep marker positions strictly increasing
+            self.pos[i] = min(max(self.pos[i], self.pos[i - 1] + 1), n - 4 + i)
+        self.q = [s[r - 1] for r in self.pos]
+
+    def add(self, x):
+        if self.pos is None:
+            self.q.append(x)
+            self.n += 1
+            if self.n == EXACT_N: self._to_markers()
+            return
+
+        q = self.q
+
+        self.n += 1
+        pos, des = self.pos, self.des
+
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]: k += 1
+
+        for i in range(k + 1, 5): pos[i] += 1
+        for i in range(5): des[i] += self.inc[i]
+
+        for i in (1, 2, 3):
+            d = des[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + d) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i])
+                    + (pos[i + 1] - pos[i] - d) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1])
+                )
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+                q[i] = qp
+                pos[i] += d
+
+    def value(self):
+        if self.n == 0:
+            return None
+        if self.pos is None:
+            return ring_quantile(self.q, self.p)
+        return self.q[2]
+
+
+def ring_quantile(values, p):
+    s = sorted(values)
+    return s[int(p * (len(s) - 1))]
+
+
+# ------------------------------------------------------------
+# PER-SYMBOL PROFILE
+# ------------------------------------------------------------
+class VolumeProfile:
+    """
+    check(symbol, start, vol) → (below session pN, below time-of-day pN)
+    Compares against history *before* this candle, then records it.
+    """
+
+    def __init__(self, interval, p=VOLUME_QUANTILE, days=TOD_DAYS, path=None):
+        self.interval = interval
+        self.p = p
+        self.days = days
+        self.path = path
+
+        self.session = {}      # symbol → P2Quantile
+        self.tod = {}          # symbol → {slot: deque(maxlen=days)}
+        self.today = {}        # symbol → {slot: vol}   committed on day change
+        self.day = None
+
+        self.tod_gen = 0       # bumped whenever the rings change (roll_day / load)
+        self._tod_json = None  # (tod_gen, serialized rings): reused until they change
+        self._write_lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            self.load()
+
+    def _slot(self, start):
+        return ((start + IST_OFFSET) % 86400) // self.interval
+
+    def _day(self, start):
+        return (start + IST_OFFSET) // 86400
+
+    def seed(self, symbol, vol):
+        """Pre-session candles (history C1-C3): session baseline only."""
+        self.session.setdefault(symbol, P2Quantile(self.p)).add(vol)
+
+    def check(self, symbol, start, vol):
+        day = self._day(start)
+        if day != self.day:
+            if self.day is None: self.day = day
+            else: self.roll_day(day)
+
+        sk = self.session.get(symbol)
+        if sk is None:
+            sk = self.session[symbol] = P2Quantile(self.p)
+        ref = sk.value()
+        below_session = ref is not None and vol < ref
+        sk.add(vol)
+
+        slot = self._slot(start)
+        ring = self.tod.get(symbol, {}).get(slot)
+        below_tod = ring is not None and len(ring) >= TOD_MIN_DAYS and vol < ring_quantile(ring, self.p)
+        self.today.setdefault(symbol, {})[slot] = vol
+
+        return below_session, below_tod
+
+    def roll_day(self, day=None):
+        """Move today's candles into the time-of-day rings and reset sessions."""
+        self._roll(day)
+        if self.path: self.save_async()   # runs on the tick worker: write off it
+
+    def _roll(self, day):
+        for symbol, slots in self.today.items():
+            rings = self.tod.setdefault(symbol, {})
+            for slot, vol in slots.items():
+                rings.setdefault(slot, deque(maxlen=self.days)).append(vol)
+        self.today = {}
+        self.session = {}
+        self.day = day
+        self.tod_gen += 1
+
+    def release(self, symbols):
+        """Unsubscribed symbols: drop session sketches (time-of-day rings stay)."""
+        for s in symbols:
+            self.session.pop(s, None)
+            self.today.pop(s, None)
+
+    # ---------------- PERSISTENCE ----------------
+    # Today's values are saved too, so a restart mid-day (or a process
+    # that never sees the next day) still commits them on the next roll.
+    # A file from an earlier day is rolled in memory as it loads, so the
+    # first candle after a morning restart does not roll on the worker.
+    #
+    # The rings only change at roll_day, so their JSON is built once per
+    # day and reused; an intraday save copies just `today` on the
+    # caller's thread. save_async() serializes and writes on a
+    # background thread (the tick worker only pays for the copy).
+    def save(self):
+        self._write(*self._copy())
+
+    def save_async(self):
+        threading.Thread(target=self._write, args=self._copy(), daemon=True).start()
+
+    def _copy(self):
+        cached = self._tod_json
+        if cached is not None and cached[0] == self.tod_gen:
+            tod = cached[1]
+        else:
+            tod = {s: {str(k): list(v) for k, v in rings.items()} for s, rings in self.tod.items()}
+        today = {s: dict(slots) for s, slots in self.today.items()}
+        return self.tod_gen, tod, today, self.day
+
+    def _write(self, gen, tod, today, day):
+        if not isinstance(tod, str):
+            tod = json.dumps(tod)
+            self._tod_json = (gen, tod)
+        head = json.dumps({"interval": self.interval, "day": day, "today": today})
+        with self._write_lock:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as fh:
+                fh.write(head[:-1] + ', "tod": ' + tod + "}")
+            os.replace(tmp, self.path)
+
+    def load(self):
+        with open(self.path) as fh:
+            data = json.load(fh)
+        if data.get("interval") != self.interval:
+            return
+        self.tod = {
+            s: {int(k): deque(v, maxlen=self.days) for k, v in rings.items()}
+            for s, rings in data["tod"].items()
+        }
+        self.today = {s: {int(k): v for k, v in slots.items()} for s, slots in data.get("today", {}).items()}
+        self.day = data.get("day")
+        self.tod_gen += 1
+
+        today = self._day(int(time.time()))
+        if self.day is not None and self.day < today:
+            self._roll(today)
+
+
+__all__ = [
+    "P2Quantile",
+    "VolumeProfile",
+    "VOLUME_QUANTILE",
+]